@@ -1,24 +1,43 @@
+# defaults; `history_type`, `history_length`, `diff_type` and `diff_length` in
+# .gitwell or ~/.gitwell_globals replace them at startup (see config.py / args.py)
 HISTORY_STYLE = 1
 MAX_HISTORY = 3
 MAX_CHANGES = 3
+DIFF_STYLE = 1
+# paths relative to the top of the repo that everything is limited to; () is
+# the whole repo (see resolve_scope)
+SCOPE = ()
+FIRST_PAINT_TARGET_MS = 150
 
 
+import time
+START_TIME = time.perf_counter()
+
 import os
-import subprocess
-import requests
 import sys
-from colorama import Fore, Style, Back
-import time
 import functools
-from InquirerPy import prompt, inquirer, get_style
-from rich.console import Console
-from rich.markdown import Markdown
-from rich.theme import Theme
+
+# --json / --porcelain never load the terminal UI (colorama, rich, InquirerPy)
+if __name__ == "__main__" and ('--json' in sys.argv or '--porcelain' in sys.argv):
+    import porcelain
+    sys.exit(porcelain.main())
+
+from colorama import Fore, Style, Back
+from backend import CommandError, cancel_all, resolve_ref, run_command, run_graph, stream_command
+from changes import ChangeTracker, CommitError, commit, enter_toplevel, preview_changes, resolve_scope, scope_args, stage_changes
+from details import get_heading_details, get_git_details, get_commit_count, get_sync_details
+from templates import TemplateStore, TemplateError
+from screen import Screen, terminal_size
+import config
+import profiling
+
+# requests, rich and InquirerPy are imported where they are used: together they
+# cost more at startup than everything needed to draw the first panel
 
 
 
 # Define a custom theme
-custom_theme = Theme({
+custom_theme = {
     "heading": "bold magenta",
     "code": "on black",
     "link": "underline cyan",
@@ -34,75 +53,96 @@ custom_theme = Theme({
     "bullet_lead": "#00ff00",
     "enumerate.number": "#0000ff",
     "enumerate_lead": "#222222",
-})
-
-# Create a console object with the custom theme
-console = Console(theme=custom_theme)
-
-# console = Console()
-
-# Function to clear console
-os.system('cls' if os.name == 'nt' else 'clear')
-
-
-
-common_style = get_style({
-    "questionmark": "#05a bold",
-    "answermark": "bold",
-    "answer": "#61afef",
-    "input": "#98c379",
-    "question": "#05a bold",
-    "answered_question": "bold",
-    "instruction": "#225",
-    "long_instruction": "#abb2bf",
-    "pointer": "",
-    "checkbox": "#98c379",
-    "separator": "",
-    "skipped": "#5c6370",
-    "validator": "",
-    "marker": "#e5c07b",
-    "fuzzy_prompt": "#05a",
-    "fuzzy_info": "#abb2bf",
-    "fuzzy_border": "#4b5263",
-    "fuzzy_match": "#c678dd",
-    "spinner_pattern": "#e5c07b",
-    "spinner_text": "#f00",
-}, style_override=False)
-    
-gitignore_choices = ['AL', 'Actionscript', 'Ada', 'Agda', 'Android', 'AppEngine', 'AppceleratorTitanium', 'ArchLinuxPackages', 'Autotools', 'C', 'C++', 'CFWheels', 'CMake', 'CUDA', 'CakePHP', 'ChefCookbook', 'Clojure', 'CodeIgniter', 'CommonLisp', 'Composer', 'Concrete5', 'Coq', 'CraftCMS', 'D', 'DM', 'Dart', 'Delphi', 'Drupal', 'EPiServer', 'Eagle', 'Elisp', 'Elixir', 'Elm', 'Erlang', 'ExpressionEngine', 'ExtJs', 'Fancy', 'Finale', 'FlaxEngine', 'ForceDotCom', 'Fortran', 'FuelPHP', 'GWT', 'Gcov', 'GitBook', 'Go', 'Godot', 'Gradle', 'Grails', 'Haskell', 'IGORPro', 'Idris', 'JBoss', 'JENKINS_HOME', 'Java', 'Jekyll', 'Joomla', 'Julia', 'KiCad', 'Kohana', 'Kotlin', 'LabVIEW', 'Laravel', 'Leiningen', 'LemonStand', 'Lilypond', 'Lithium', 'Lua', 'Magento', 'Maven', 'Mercury', 'MetaProgrammingSystem', 'Nanoc', 'Nim', 'Node', 'OCaml', 'Objective-C', 'Opa', 'OpenCart', 'OracleForms', 'Packer', 'Perl', 'Phalcon', 'PlayFramework', 'Plone', 'Prestashop', 'Processing', 'PureScript', 'Python', 'Qooxdoo', 'Qt', 'R', 'ROS', 'Racket', 'Rails', 'Raku', 'RhodesRhomobile', 'Ruby', 'Rust', 'SCons', 'Sass', 'Scala', 'Scheme', 'Scrivener', 'Sdcc', 'SeamGen', 'SketchUp', 'Smalltalk', 'Stella', 'SugarCRM', 'Swift', 'Symfony', 'SymphonyCMS', 'TeX', 'Terraform', 'Textpattern', 'TurboGears2', 'TwinCAT3', 'Typo3', 'Unity', 'UnrealEngine', 'VVVV', 'VisualStudio', 'Waf', 'WordPress', 'Xojo', 'Yeoman', 'Yii', 'ZendFramework', 'Zephir']
-
-inq_commit = inquirer.text(
-    multiline=True,
-    message="\nCommit:",  
-    qmark="",
-    amark="",
-    instruction="(ESC + ENTER to confirm, supports markdown)",
-    style=common_style,
-    mandatory=False,
-    raise_keyboard_interrupt=False
-    # default=""
-)
-
-inq_init = inquirer.confirm(
-    message="Initialize a repository?",
-    default=False,
-    confirm_letter="y",
-    reject_letter="n",
-    transformer=lambda result: "Y          Initializing..." if result else "N          Aborting.",
-    style=common_style,
-)
-
-inq_gitignore = inquirer.fuzzy(
-    message="Use .gitignore template?",
-    choices= gitignore_choices,
-    # multiselect=True,
-    # validate=lambda result: len(result) > 1,
-    # default='Node',
-    # invalid_message="minimum 2 selections",
-    transformer=lambda result: f"Y          Copying template '{result}'..." if result else "N          Skipping template.",
-    max_height="30%",
-    style=common_style
-)
+}
+
+console = None
+
+# Create a console object with the custom theme, only needed for markdown history
+def get_console():
+    global console
+    if console is None:
+        from rich.console import Console
+        from rich.theme import Theme
+        console = Console(theme=Theme(custom_theme))
+    return console
+
+
+
+@functools.lru_cache(maxsize=None)
+def get_common_style():
+    from InquirerPy import get_style
+    return get_style({
+        "questionmark": "#05a bold",
+        "answermark": "bold",
+        "answer": "#61afef",
+        "input": "#98c379",
+        "question": "#05a bold",
+        "answered_question": "bold",
+        "instruction": "#225",
+        "long_instruction": "#abb2bf",
+        "pointer": "",
+        "checkbox": "#98c379",
+        "separator": "",
+        "skipped": "#5c6370",
+        "validator": "",
+        "marker": "#e5c07b",
+        "fuzzy_prompt": "#05a",
+        "fuzzy_info": "#abb2bf",
+        "fuzzy_border": "#4b5263",
+        "fuzzy_match": "#c678dd",
+        "spinner_pattern": "#e5c07b",
+        "spinner_text": "#f00",
+    }, style_override=False)
+
+
+template_store = None
+
+def get_template_store():
+    global template_store
+    if template_store is None:
+        template_store = TemplateStore()
+    return template_store
+
+
+# Prompts are built when they are shown, not at import
+def inq_commit():
+    from InquirerPy import inquirer
+    return inquirer.text(
+        multiline=True,
+        message="\nCommit:",  
+        qmark="",
+        amark="",
+        instruction="(ESC + ENTER to confirm, supports markdown)",
+        style=get_common_style(),
+        mandatory=False,
+        raise_keyboard_interrupt=False
+        # default=""
+    )
+
+def inq_init():
+    from InquirerPy import inquirer
+    return inquirer.confirm(
+        message="Initialize a repository?",
+        default=False,
+        confirm_letter="y",
+        reject_letter="n",
+        transformer=lambda result: "Y          Initializing..." if result else "N          Aborting.",
+        style=get_common_style(),
+    )
+
+def inq_gitignore():
+    from InquirerPy import inquirer
+    return inquirer.fuzzy(
+        message="Use .gitignore template?",
+        choices= get_template_store().names(),
+        multiselect=True,
+        # validate=lambda result: len(result) > 1,
+        # default='Node',
+        # invalid_message="minimum 2 selections",
+        transformer=lambda result: f"Y          Copying template '{', '.join(result)}'..." if result else "N          Skipping template.",
+        max_height="30%",
+        style=get_common_style()
+    )
 
 
 # inq_init.execute()
@@ -111,38 +151,6 @@ inq_gitignore = inquirer.fuzzy(
 
 
 
-def useCache(cache_time=5000):
-    def decorator(func):
-        cache = {}
-
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            key = str(args) + str(kwargs)
-            cached_result, cached_time = cache.get(key, (None, None))
-
-            if cached_time is None or time.monotonic() - cached_time > cache_time / 1000:
-                # Cache is empty or expired
-                result = func(*args, **kwargs)
-                cache[key] = (result, time.monotonic())
-            else:
-                # Cache hit
-                result = cached_result
-
-            return result
-
-        return wrapper
-    return decorator
-
-
-
-
-
-def run_command(command):
-    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, shell=True)
-    output, _ = process.communicate()
-    return output.decode().strip()
-
-
 def msg_warn(msg):
     return Style.RESET_ALL + Style.BRIGHT + Fore.YELLOW + msg + Style.RESET_ALL
 
@@ -165,17 +173,28 @@ def msg_select(msg):
 
 
 
-# Function to clear console
+screen = Screen()
+
+# Function to clear console (escape codes, no `clear` subprocess)
 def clear_console():
-    os.system('cls' if os.name == 'nt' else 'clear')
+    screen.clear()
+
+
+# GITWELL_TIMING=1 reports time-to-first-paint (the heading drawn) on stderr
+def report_first_paint():
+    if not os.environ.get('GITWELL_TIMING'):
+        return
+    elapsed = (time.perf_counter() - START_TIME) * 1000
+    verdict = 'ok' if elapsed <= FIRST_PAINT_TARGET_MS else 'over target'
+    print(f"first paint: {elapsed:.0f} ms (target {FIRST_PAINT_TARGET_MS} ms, {verdict})", file=sys.stderr)
 
 
 
-# Function for checking and initialising git repo
+# Function for checking and initialising git repo; True if it had to prompt
 def init_git():
     if not os.path.isdir(".git"):
         # print(msg_warn("!! dir is not a git repo."))
-        willInit = inq_init.execute()
+        willInit = inq_init().execute()
         # init_git_response = input(msg_bright("Initialize a repository? ") + msg_dim("(N) ") + Fore.CYAN)
         if willInit:
             print("\033[A\033[2K", end="")
@@ -185,6 +204,7 @@ def init_git():
             run_command('git init')
             print("\033[A\033[2K", end="")
             print(msg_bright("Initialize a repository? ") + Fore.CYAN + Style.BRIGHT + "Y" + msg_dim(19 * ' ' + "Repo initialized."))
+            return True
         else:
             print("\033[A\033[2K", end="")
             print(msg_bright("Initialize a repository? ") + Fore.CYAN + Style.BRIGHT + "N" + msg_dim(19 * ' ' + "Aborted."))
@@ -232,7 +252,7 @@ def format_template_name(template_name, max_length=20):
 
 
 
-# Function for checking and creating .gitignore
+# Function for checking and creating .gitignore; True if it had to prompt
 def create_gitignore():
     if not os.path.isfile('.gitignore'):
         # print(msg_warn("\n!! No '.gitignore' file found."))
@@ -241,26 +261,31 @@ def create_gitignore():
         # print("\033[A\033[2K", end="")
         # print(msg_bright("Copy .gitignore template? ") + Fore.CYAN + Style.BRIGHT + "Y")
         # template_name = input(msg_bright("Use .gitignore template: ") + msg_dim("(Node) ") +  Fore.CYAN)
-        template_name = inq_gitignore.execute()
-        if template_name.lower() == '':
-            template_name = "Node"
-        
+        template_names = inq_gitignore().execute()
+        # nothing picked: carry on without a .gitignore (asked again next run)
+        if not template_names:
+            return True
+        template_name = ', '.join(template_names)
+
         formatted_template_name = format_template_name(template_name)
         
         print("\033[A\033[2K", end="")
         print(msg_bright("Use .gitignore template? ") + Fore.CYAN + Style.BRIGHT + formatted_template_name + msg_dim("Copying template..."))
 
-        response = requests.get(f'https://raw.githubusercontent.com/github/gitignore/master/{template_name}.gitignore')
-        if response.status_code == 200:
-            with open('.gitignore', 'w') as f:
-                f.write(response.text)
-            print("\033[A\033[2K", end="")
-            print(msg_bright("Use .gitignore template? ") + Fore.CYAN + Style.BRIGHT + formatted_template_name + msg_dim("Template copied.\n"))
+        try:
+            content = get_template_store().compose(template_names)
+        except TemplateError as e:
+            # not worth stopping the commit over; the file can be made later
+            print(msg_warn(f"Skipped '.gitignore': template '{template_name}' is unavailable. {e}"))
+            return True
+
+        with open('.gitignore', 'w') as f:
+            f.write(content)
+        print("\033[A\033[2K", end="")
+        print(msg_bright("Use .gitignore template? ") + Fore.CYAN + Style.BRIGHT + formatted_template_name + msg_dim("Template copied.\n"))
+        return True
 
-            # print(Fore.GREEN + f"Created '.gitignore' from template: '{template_name}'" + Style.RESET_ALL)
-        else:
-            print(Fore.RED + Style.BRIGHT + f"Error creating '.gitignore' from template: '{template_name}'. Verify the template exists or create the file manually.")
-            sys.exit()
+        # print(Fore.GREEN + f"Created '.gitignore' from template: '{template_name}'" + Style.RESET_ALL)
         # else:
         #     with open('.gitignore', 'w') as f:
         #         f.write("# TODO- Add .gitignore contents")
@@ -269,96 +294,91 @@ def create_gitignore():
 
 
 
-@useCache(3000)
-def get_git_details():
-    try:
-        origin = run_command('git remote get-url origin')
-    except Exception as e:
-        origin = None
-    
-    username = run_command('git config user.name')
-    email = run_command('git config user.email')
-    branch = run_command('git symbolic-ref --short HEAD')
-
-    if origin:
-        fetch_url = run_command('git remote get-url origin')
-        push_url = run_command('git remote get-url --push origin')
-        fetch_user, fetch_repo = fetch_url.split('/')[-2:]
-        fetch_repo = fetch_repo.replace('.git', '')
-        push_user, push_repo = push_url.split('/')[-2:]
-        push_repo = push_repo.replace('.git', '')
-    else:
-        fetch_url = push_url = 'local'
-        fetch_user = push_user = 'local'
-        fetch_repo = push_repo = run_command('git rev-parse --show-toplevel').split('/')[-1]
+def render_break():
+    return '\n' + Fore.BLACK + '-' * 80
 
-    run_command('git add .')
-    # changed_files = run_command('git diff --cached --name-only').split('\n')
-    # changed_files = list(filter(None, run_command('git diff --cached --name-status --numstat').split('\n')))
 
-    name_status_lines = list(filter(None, run_command('git diff --cached --name-status').split('\n')))
-    numstat_lines = list(filter(None, run_command('git diff --cached --numstat').split('\n')))
+def print_break():
+    print(render_break(), end="")
 
-    combined_changes = {}
 
-    for name_status_line, numstat_line in zip(name_status_lines, numstat_lines):
-        status, filename = name_status_line.split(maxsplit=1)
-        additions, deletions, _ = numstat_line.split(maxsplit=2)
 
-        additions = '0' if additions == '-' else additions
-        deletions = '0' if deletions == '-' else deletions
+# "  +2 -1" against a tracking branch, nothing when there isn't one
+def render_sync(ahead, behind, upstream=None):
+    if ahead is None:
+        return ''
+    sync = f"  {Fore.GREEN}+{ahead} {Fore.RED}-{behind}{Style.RESET_ALL}"
+    return sync + (msg_dim(f" {upstream}") if upstream else '')
 
-        # print({
-        #     "status":status,
-        #     "filename":filename,
-        #     "additions":additions,
-        #     "deletions":deletions,
-        # })
 
-        if filename in combined_changes:
-            combined_changes[filename]['additions'] += int(additions)
-            combined_changes[filename]['deletions'] += int(deletions)
-        else:
-            combined_changes[filename] = {
-                'status': status,
-                'additions': int(additions),
-                'deletions': int(deletions)
-            }
+def render_heading(g):
+    out = []
+    out.append(Fore.BLUE + Style.BRIGHT + f"{g['username']}" + msg_dim(f"  {g['email']}") + '\n')
+    out.append(f" fetch << {Fore.BLUE}{g['fetch_user']}/{Fore.WHITE}{g['fetch_repo']}/{Fore.YELLOW}{g['branch']}" + Style.RESET_ALL + render_sync(g.get('ahead'), g.get('behind'), g.get('upstream')) + '\n')
+    out.append(f" push  >> {Fore.BLUE}{g['push_user']}/{Fore.WHITE}{g['push_repo']}/{Fore.YELLOW}{g['branch']}" + Style.RESET_ALL + render_sync(g.get('push_ahead'), g.get('push_behind')) + '\n')
+    return ''.join(out)
 
-    return {
-        "username": username,
-        "email": email,
-        "branch": branch,
-        "fetch_user": fetch_user,
-        "fetch_url": fetch_url,
-        "fetch_repo": fetch_repo,
-        "push_user": push_user,
-        "push_url": push_url,
-        "push_repo": push_repo,
-        "changed_files": combined_changes,
-    }
 
+def print_heading():
+    print(render_heading(get_git_details(MAX_CHANGES, SCOPE)), end="")
 
 
-def print_break():
-    print('\n' + Fore.BLACK + '-' * 80, end="")
 
+# Markdown is rendered into a string so history can be drawn like any other panel
+def render_markdown(text, width=None):
+    from rich.markdown import Markdown
+    console = get_console()
+    with console.capture() as capture:
+        console.print(Markdown(text), width=width)
+    return capture.get()
 
 
-def print_heading():
-    g = get_git_details()
+render_cache = None
 
-    print(Fore.BLUE + Style.BRIGHT + f"{g['username']}" + msg_dim(f"  {g['email']}"))
-    print(f" fetch << {Fore.BLUE}{g['fetch_user']}/{Fore.WHITE}{g['fetch_repo']}/{Fore.YELLOW}{g['branch']}" + Style.RESET_ALL)
-    print(f" push  >> {Fore.BLUE}{g['push_user']}/{Fore.WHITE}{g['push_repo']}/{Fore.YELLOW}{g['branch']}" + Style.RESET_ALL)
+# Rendered commit bodies under .git/gitwell/, by style, width and hash. Commits
+# never change, so after the first run markdown history is a read of this file
+# and rich isn't imported at all. The header line has the relative date in it,
+# so it's always drawn fresh.
+def get_render_cache():
+    global render_cache
+    if render_cache is None:
+        from cache import SnapshotCache
+        render_cache = SnapshotCache(name='render.json', max_entries=256)
+    return render_cache
 
- 
 
-def print_history(last = False):
+def get_markdown_history(limit):
+    fields = ('hash', 'short', 'date', 'time', 'author', 'message')
+    # git log fails on a branch with no commits yet
+    if not resolve_ref('HEAD'):
+        return []
+    records = stream_command(['git', '--literal-pathspecs', 'log', '-z', f'-n{limit}', '--reverse', '--date=format:%m/%d %H:%M', '--format=%H%x1f%h%x1f%ad%x1f%at%x1f%an%x1f%B'] + (['--'] + list(SCOPE) if SCOPE else []))
+    return [dict(zip(fields, record.split('\x1f', 5))) for record in records if record]
+
+
+def render_markdown_commit(commit, username, width, cache):
+    from history import relative_time
+    subject, _, body = commit['message'].partition('\n')
+    header = f"{Fore.YELLOW + Back.BLACK}{commit['short']} {Fore.BLUE}{commit['date']}{Style.RESET_ALL + Fore.BLACK} {relative_time(int(commit['time']))} {Fore.GREEN}{commit['author']}{Style.RESET_ALL} {subject}"
+    header = header.replace(username, '') if username else header
+
+    key = f"{HISTORY_STYLE}:{width}:{commit['hash']}:{username}"
+    rendered = cache.get(key, {})
+    if rendered is None:
+        body = body.strip('\n')
+        body = body.replace(username, '') if username else body
+        # the header counts as the first of the 6 lines shown
+        res = truncate_text(body, 5)
+        rendered = (render_markdown(res['text'], width) if res['text'].strip() else '') + msg_dim(res['remaining'])
+        cache.put(key, rendered, {})
+    return header + Style.RESET_ALL + '\n' + rendered
+
+
+def render_history(g, last = False):
     if HISTORY_STYLE == 0:
-        return
-    
-    g = get_git_details()
+        return ''
+
+    out = []
 
     if last:
         commit_limit = 1 # Display only the most recent commit if `last` is True, otherwise display the last 10 commits
@@ -367,34 +387,42 @@ def print_history(last = False):
         commits = history.split('---')
         commits = [entry for entry in commits if entry]
 
-        print_break()
-        print('')
+        out.append(render_break())
+        out.append('\n')
         for commit in commits[:commit_limit]:
             commit = commit.replace(g['username'], '')
             # console.print(Markdown(commit))
-            print(commit)
+            out.append(commit + '\n')
     
     else:
         commit_limit = MAX_HISTORY # Display only the most recent commit if `last` is True, otherwise display the last 10 commits
         
-        history = "---"
+        history_command = None
+
         if HISTORY_STYLE == 1:
-            history = run_command(f'git log --pretty=format:"---{Fore.YELLOW + Back.BLACK}%h {Fore.BLUE}%ad{Style.RESET_ALL + Fore.BLACK} %ar {Fore.GREEN}%an{Style.RESET_ALL} %s" --date=format:"%m/%d %H:%M" --reverse')
+            history_command = f'git --literal-pathspecs log --pretty=format:"---{Fore.YELLOW + Back.BLACK}%h {Fore.BLUE}%ad{Style.RESET_ALL + Fore.BLACK} %ar {Fore.GREEN}%an{Style.RESET_ALL} %s" --date=format:"%m/%d %H:%M" -n {commit_limit} --reverse{scope_args(SCOPE)}'
         elif HISTORY_STYLE == 2:
-            history = run_command(f'git log --pretty=format:"---{Fore.YELLOW + Back.BLACK}%h {Fore.BLUE}%ad{Style.RESET_ALL + Fore.BLACK} %ar {Fore.GREEN}%an{Style.RESET_ALL} \n%s" --date=format:"%m/%d %H:%M" --reverse')
+            history_command = f'git --literal-pathspecs log --pretty=format:"---{Fore.YELLOW + Back.BLACK}%h {Fore.BLUE}%ad{Style.RESET_ALL + Fore.BLACK} %ar {Fore.GREEN}%an{Style.RESET_ALL} \n%s" --date=format:"%m/%d %H:%M" -n {commit_limit} --reverse{scope_args(SCOPE)}'
         elif HISTORY_STYLE == 3:
-            history = run_command(f'git log --pretty=format:"---{Fore.YELLOW + Back.BLACK}%h {Fore.BLUE}%ad{Style.RESET_ALL + Fore.BLACK} %ar {Fore.GREEN}%an{Style.RESET_ALL} ===%B" --date=format:"%m/%d %H:%M" --reverse')
+            return render_markdown_history(g, commit_limit)
+
+        # the log and the commit count don't depend on each other
+        results = run_graph({
+            'history': (lambda results: run_command(history_command) if history_command else '---', ()),
+            'count': (lambda results: get_commit_count(SCOPE), ()),
+        })
+        history = results['history']
 
         commits = history.split('---')
         commits = [entry for entry in commits if entry]
 
         if len(commits) == 0:
-            return
+            return ''
 
-        print_break()
-        print(Fore.BLUE + Style.BRIGHT + "\nHistory:" + msg_dim(f" ({len(commits)} commits)"))
+        out.append(render_break())
+        out.append(Fore.BLUE + Style.BRIGHT + "\nHistory:" + msg_dim(f" ({results['count']} commits)") + '\n')
         
-        for commit in commits[-commit_limit:]:
+        for commit in commits:
             commit = commit.replace(g['username'], '')
 
             if HISTORY_STYLE == 1:
@@ -402,64 +430,72 @@ def print_history(last = False):
                 commit = format_template_name(commit, 113)
 
 
-            if HISTORY_STYLE > 2:
-                commit = commit.replace("===", " " * 100)
-                # print(msg_dim('-' * 40))
-                res = truncate_text(commit)
-                if not "text" in res:
-                    return
-                
-                # print(res["text"])
-                console.print(Markdown("\n" + res["text"]))
-                print(msg_dim(res['remaining']), end="")
-            else:
-                print(commit)
+            out.append(commit + '\n')
+
+    return ''.join(out)
+
+
+def render_markdown_history(g, limit):
+    results = run_graph({
+        'history': (lambda results: get_markdown_history(limit), ()),
+        'count': (lambda results: get_commit_count(SCOPE), ()),
+    })
+    if not results['history']:
+        return ''
+
+    cache = get_render_cache()
+    width = terminal_size()[0]
+    out = [render_break()]
+    out.append(Fore.BLUE + Style.BRIGHT + "\nHistory:" + msg_dim(f" ({results['count']} commits)") + '\n')
+    cached = len(cache.entries)
+    for commit in results['history']:
+        out.append(render_markdown_commit(commit, g['username'], width, cache))
+    # only rewritten when something new was rendered, not for hits alone
+    if len(cache.entries) != cached:
+        cache.save()
+    return ''.join(out)
+
+
+def print_history(last = False):
+    print(render_history(get_git_details(MAX_CHANGES, SCOPE), last), end="")
 
 
 oldG = {}
 
-def split_and_format(s, tabs=2):
-    if '\t' in s:
-        word1, word2 = s.split()
+def split_and_format(filename, old_path=None, tabs=2):
+    if old_path:
         tabs = '\t' * tabs + '   '
-        return f'{Fore.BLACK}|{Style.RESET_ALL} {word1}\n{tabs}{Fore.BLACK}>{Style.RESET_ALL} {word2}'
+        return f'{Fore.BLACK}|{Style.RESET_ALL} {old_path}\n{tabs}{Fore.BLACK}>{Style.RESET_ALL} {filename}'
     else:
-        return s
+        return filename
 
-def print_changed(useOld=False):
-    global oldG  # Add this line to indicate you want to use the global variable
-    g = oldG if useOld else get_git_details()
-    oldG = g.copy()
+def render_changed(g):
     files = g['changed_files']
-    print_break()
+    out = [render_break()]
 
+    if not files and g.get('stale'):
+        out.append(msg_warn("\nChanges unavailable: ") + msg_dim(g['stale']) + '\n')
+        return ''.join(out)
     if not files:
-        print(msg_err("\nNo changed files found... Exiting.\n"))
-        sys.exit()
+        out.append(msg_err("\nNo changed files found.\n") + '\n')
+        return ''.join(out)
 
-    changed_count = 0
-    added_count = 0
-    deleted_count = 0
-
-    for filename, changes in list(files.items()):
-        if changes['status'] == 'M':
-            changed_count += 1
-        elif changes['status'] == 'A':
-            added_count += 1
-        elif changes['status'] == 'D':
-            deleted_count += 1
-        elif 'R' in changes['status']:
-            changed_count += 1
+    counts = g['change_counts']
+    changed_count = counts['M'] + counts['R']
+    added_count = counts['A']
+    deleted_count = counts['D']
     added = ""
     deleted = ""
     if added_count > 0:
         added = f", {added_count} added"
     if deleted_count > 0:
-        added = f", {deleted_count} deleted"
+        deleted = f", {deleted_count} deleted"
     
-    print(Fore.BLUE + Style.BRIGHT + "\nChanges:" + msg_dim(f" ({changed_count} changed{added}{deleted})"))
+    stale = msg_warn(f"  stale: {g['stale']}") if g.get('stale') else ''
+    scope = msg_dim(f"  in {' '.join(SCOPE)}") if SCOPE else ''
+    out.append(Fore.BLUE + Style.BRIGHT + "\nChanges:" + msg_dim(f" ({changed_count} changed{added}{deleted})") + scope + stale + '\n')
 
-    for filename, changes in list(files.items())[:MAX_CHANGES]: 
+    for filename, changes in files.items():
         # print(filename, changes)
         # added, removed, path = file.split('\t')
         shortStat = format_template_name(f'{changes["status"]}', 4)
@@ -468,11 +504,81 @@ def print_changed(useOld=False):
         diff = f"{Fore.BLACK + shortStat} {Fore.GREEN}+{shortAdd} {Fore.RED}-{shortDel}{Style.RESET_ALL}"
         # shortDiff = format_template_name(diff, 14)
         # name = format_template_name(filename, 30)
-        splitFiles = split_and_format(filename)
-        print(f"{msg_warn('-')} {diff} {Style.RESET_ALL + splitFiles}")
+        splitFiles = split_and_format(filename, changes['old_path'])
+        out.append(f"{msg_warn('-')} {diff} {Style.RESET_ALL + splitFiles}" + '\n')
+
+    if g['changed_total'] > len(files):
+        out.append(msg_dim(f" ...{g['changed_total'] - len(files)} more files") + '\n')
+        # every change, a line per directory
+        for entry in g.get('changed_dirs', []):
+            name = entry['path'] + {'tree': '', 'files': '*', 'rest': ' (other)'}[entry['kind']]
+            breakdown = ', '.join(f"{entry['counts'][key]:,} {key}" for key in entry['counts'] if entry['counts'][key])
+            out.append(f"   {format_template_name(name, 30)} {Fore.YELLOW}+{entry['total']:,} files{Style.RESET_ALL}" + msg_dim(f"  {breakdown}") + '\n')
+
+    return ''.join(out)
+
+
+# A few lines of diff per listed file: DIFF_STYLE 0 hides it, 1 shows only the
+# changed lines, 2+ adds three lines of context
+def render_diff(g):
+    if DIFF_STYLE == 0 or not g['changed_files']:
+        return ''
+    previews = preview_changes(g['changed_files'], context=0 if DIFF_STYLE == 1 else 3)
+    out = [render_break(), Fore.BLUE + Style.BRIGHT + "\nDiff:" + Style.RESET_ALL + '\n']
+    for path, preview in previews.items():
+        if preview['skipped']:
+            out.append(msg_bright(f"  {path}") + msg_dim(f" ({preview['skipped']})") + '\n')
+            continue
+        if not preview['lines']:
+            continue
+        out.append(msg_bright(f"  {path}") + '\n')
+        for line in preview['lines']:
+            line = line[:100]
+            if line.startswith('@@'):
+                out.append(f"    {Fore.CYAN}{line}{Style.RESET_ALL}\n")
+            elif line.startswith('+'):
+                out.append(f"    {Fore.GREEN}{line}{Style.RESET_ALL}\n")
+            elif line.startswith('-'):
+                out.append(f"    {Fore.RED}{line}{Style.RESET_ALL}\n")
+            else:
+                out.append(msg_dim(f"    {line}") + '\n')
+        if preview['truncated']:
+            out.append(msg_dim("    ...") + '\n')
+    return ''.join(out)
+
+
+def render_changes_panel(g):
+    return render_changed(g) + render_diff(g)
+
 
-    if len(files) > MAX_CHANGES:
-        print(msg_dim(f" ...{len(files) - MAX_CHANGES} more files"))
+def render_unavailable(title, error):
+    return render_break() + '\n' + msg_warn(f"{title} unavailable: ") + msg_dim(str(error)) + '\n'
+
+
+# A panel whose git commands failed or ran out of time becomes a one-line
+# notice, so the rest of the frame still shows
+def render_panel(title, render):
+    try:
+        return render()
+    except CommandError as e:
+        return render_unavailable(title, e)
+
+
+def render_no_changes():
+    scope = f" in {' '.join(SCOPE)}" if SCOPE else ''
+    return render_break() + '\n' + msg_err(f"\nNo changed files found{scope}... Exiting.\n") + '\n'
+
+
+def print_changed(useOld=False):
+    global oldG  # Add this line to indicate you want to use the global variable
+    g = oldG if useOld else get_git_details(MAX_CHANGES, SCOPE)
+    oldG = g.copy()
+
+    if not g['changed_files']:
+        print(render_no_changes(), end="")
+        sys.exit()
+
+    print(render_changed(g), end="")
 
 
 # def load_config():
@@ -493,31 +599,332 @@ def print_changed(useOld=False):
 
 
  
+# Stage everything and commit; raises CommitError with git's reason
+def commit_changes(message):
+    # nothing is staged until here
+    stage_changes(SCOPE or ('.',))
+    return commit(message, SCOPE)
+
+
+# The post-commit summary, built from what `git commit` reported rather than
+# another `git log`
+def render_commit(result):
+    out = [render_break(), '\n']
+    out.append(f"{Fore.YELLOW + Back.BLACK}{result['hash']} {Fore.BLUE}{time.strftime('%m/%d %H:%M')}{Style.RESET_ALL + Fore.BLACK} just now{Style.RESET_ALL}")
+    out.append(msg_dim(f"  {result['files']} files") + f" {Fore.GREEN}+{result['insertions']} {Fore.RED}-{result['deletions']}{Style.RESET_ALL}")
+    out.append(f" {Style.BRIGHT + Fore.WHITE}\n\n{result['message']}" + Style.RESET_ALL + '\n')
+    return ''.join(out)
+
+
+
+# Resident dashboard: redraws the heading, history and changes panels as the
+# repo changes, with the commit prompt one keypress away
+def run_watch():
+    import watch
+    tracker = ChangeTracker(MAX_CHANGES, SCOPE)
+
+    def commit_from_watch():
+        message = inq_commit().execute()
+        if message:
+            try:
+                commit_changes(message)
+            except CommitError as e:
+                input(msg_err(f"Error creating commit: {e}") + msg_dim("  (enter to continue)"))
+
+    watch.run(
+        panels=[
+            ('heading', lambda: render_panel('Heading', lambda: render_heading({**get_heading_details(), **get_sync_details(get_heading_details()['branch'])}))),
+            ('history', lambda: render_panel('History', lambda: render_history(get_heading_details()))),
+            ('changes', lambda: render_panel('Changes', lambda: render_changes_panel({**get_heading_details(), **tracker.details()}))),
+        ],
+        tracker=tracker,
+        commit=commit_from_watch,
+        footer=render_break() + '\n' + msg_dim("[c] commit  [r] refresh  [q] quit"),
+    )
+
+
+
+def render_history_page(commits, start, history):
+    from history import relative_time
+    from screen import fit
+    # one row per commit, short of the last column so nothing wraps
+    width = terminal_size()[0] - 1
+    out = [Fore.BLUE + Style.BRIGHT + "History:" + msg_dim(f" {start + 1}-{start + len(commits)} of {history.known()}{'' if history.done else '+'}") + '\n']
+    for commit in commits:
+        stamp = time.strftime('%m/%d %H:%M', time.localtime(commit['time']))
+        line = f"{Fore.YELLOW + Back.BLACK}{commit['hash'][:7]} {Fore.BLUE}{stamp}{Style.RESET_ALL + Fore.BLACK} {relative_time(commit['time'])} {Fore.GREEN}{commit['author']}{Style.RESET_ALL} {commit['subject']}"
+        out.append(fit(line, width) + Style.RESET_ALL + '\n')
+    return ''.join(out)
+
+
+# Every commit reachable from HEAD (touching the scope), read a page at a time
+# as it's scrolled to
+def run_history():
+    import history
+    history.browse(
+        history.History(pathspec=SCOPE),
+        render_history_page,
+        footer=render_break() + '\n' + msg_dim("[j/k] line  [space/b] page  [g] top  [q] quit"),
+    )
+
+
+# --progressive: the commit prompt comes up at once and the panels are printed
+# above it, in order, as each one is ready. Only the commit waits for the
+# change list; if there turns out to be nothing to commit, the prompt is
+# closed. Returns (details, message), or exits when there are no changes.
+def run_progressive():
+    from concurrent.futures import ThreadPoolExecutor
+    from prompt_toolkit.patch_stdout import patch_stdout
+
+    def timed(name, fn):
+        def run():
+            with profiling.phase(name):
+                return fn()
+        return run
+
+    pool = ThreadPoolExecutor(max_workers=3)
+    heading = pool.submit(timed('heading', lambda: render_panel('Heading', lambda: render_heading({**get_heading_details(), **get_sync_details(get_heading_details()['branch'])}))))
+    history = pool.submit(timed('history', lambda: render_panel('History', lambda: render_history(get_heading_details()))))
+    details = pool.submit(timed('changes', lambda: get_git_details(MAX_CHANGES, SCOPE)))
+
+    prompt = inq_commit()
+    # InquirerPy keeps the prompt_toolkit application on its session
+    app = prompt._session.app
+
+    def close_prompt():
+        if app.future is not None and not app.future.done():
+            app.exit(result=None)
+
+    def show_panels():
+        try:
+            print(heading.result(), end='', flush=True)
+            print(history.result(), end='', flush=True)
+            g = details.result()
+        except Exception as e:
+            print(msg_err(f"Error: {e}"), flush=True)
+            return
+        if g['changed_files']:
+            print(render_panel('Changes', lambda: render_changes_panel(g)) + render_break(), flush=True)
+            return
+        print(render_no_changes(), end='', flush=True)
+        # before or after the prompt has started, whichever this is
+        app.pre_run_callables.append(close_prompt)
+        if app.is_running:
+            app.loop.call_soon_threadsafe(close_prompt)
+
+    # first paint is the prompt coming up
+    app.pre_run_callables.append(report_first_paint)
+    printer = pool.submit(show_panels)
+    with patch_stdout(raw=True):
+        with profiling.phase('prompt'):
+            message = prompt.execute()
+        if message and not details.done():
+            print(msg_dim("Waiting for the change list..."), flush=True)
+        g = details.result()
+        printer.result()
+    pool.shutdown()
+
+    # the panels went above the prompt, so the screen's layout is unknown
+    screen.lost()
+    if not g['changed_files']:
+        sys.exit()
+    return g, message
+
+
+def apply_config(values):
+    global HISTORY_STYLE, MAX_HISTORY, MAX_CHANGES, DIFF_STYLE
+    HISTORY_STYLE = values['history_type']
+    MAX_HISTORY = values['history_length']
+    MAX_CHANGES = values['diff_length']
+    DIFF_STYLE = values['diff_type']
+
+
+def parse_cli(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog='asdf', description='Easy tracking and committing for frequent gitters.')
+    parser.add_argument('paths', nargs='*', help='only show, stage and commit changes under these paths (default: the directory asdf is run in)')
+    parser.add_argument('--refresh-templates', action='store_true', help='update the cached .gitignore templates and exit')
+    parser.add_argument('--watch', action='store_true', help='keep running and redraw as the repo changes')
+    parser.add_argument('--history', action='store_true', help='browse the full history a page at a time')
+    parser.add_argument('--workspace', metavar='DIR', help='summarise every repo under DIR, then commit in one of them')
+    parser.add_argument('--jobs', type=int, help='repos queried at once with --workspace')
+    parser.add_argument('--json', action='store_true', help='print repo state as JSON and exit (see porcelain.py)')
+    parser.add_argument('--porcelain', action='store_true', help='print repo state as NDJSON and exit')
+    parser.add_argument('--progressive', action='store_true', help='show the commit prompt at once and fill in the panels above it as they are ready')
+    parser.add_argument('--profile', nargs='?', const=True, metavar='TRACE.json', help='print phase, command and cache timings on exit; optionally write a Chrome trace')
+    args, _ = parser.parse_known_args(argv)
+    return args
+
+
+def format_counts(counts, total):
+    if not total:
+        return msg_dim("clean")
+    parts = [f"{counts['M'] + counts['R']} changed"]
+    if counts['A']:
+        parts.append(f"{counts['A']} added")
+    if counts['D']:
+        parts.append(f"{counts['D']} deleted")
+    return ', '.join(parts)
+
+
+def render_workspace(root, summaries):
+    names = [os.path.relpath(summary['path'], root) for summary in summaries]
+    width = min(40, max(len(name) for name in names))
+    branch_width = min(24, max(len(summary['branch'] or '') for summary in summaries))
+    out = [Fore.BLUE + Style.BRIGHT + "Workspace:" + msg_dim(f" {len(summaries)} repos in {os.path.abspath(root)}") + '\n']
+    for name, summary in zip(names, summaries):
+        if summary['error']:
+            out.append(f"{msg_bright(format_template_name(name, width))}  " + msg_warn("unavailable: ") + msg_dim(summary['error']) + '\n')
+            continue
+        if summary['ahead'] is None:
+            sync = msg_dim(format_template_name("no upstream", 12))
+        else:
+            padding = ' ' * max(0, 12 - len(f"+{summary['ahead']} -{summary['behind']}"))
+            sync = f"{Fore.GREEN}+{summary['ahead']} {Fore.RED}-{summary['behind']}{Style.RESET_ALL}{padding}"
+        out.append(
+            f"{msg_bright(format_template_name(name, width))}  "
+            f"{Fore.YELLOW}{format_template_name(summary['branch'] or '', branch_width)}{Style.RESET_ALL}  "
+            f"{sync}  {format_counts(summary['change_counts'], summary['changed_total'])}\n"
+        )
+    return ''.join(out)
+
+
+def inq_workspace(root, summaries):
+    from InquirerPy import inquirer
+    from InquirerPy.base.control import Choice
+    choices = [
+        Choice(value=summary['path'], name=f"{os.path.relpath(summary['path'], root)} ({summary['changed_total']} files)")
+        for summary in summaries if summary['changed_total']
+    ]
+    return inquirer.select(
+        message="Commit in:",
+        choices=choices + [Choice(value=None, name="Exit")],
+        default=choices[0].value if choices else None,
+        style=get_common_style(),
+        mandatory=False,
+        raise_keyboard_interrupt=False,
+    )
+
+
+# Summary table for every repo under `root`; returns the repo picked to commit
+# in, or None
+def run_workspace(root, jobs=None):
+    import workspace
+    repos = workspace.find_repos(root)
+    if not repos:
+        print(msg_err(f"No git repositories found under '{root}'."))
+        return None
+
+    summaries = workspace.collect_workspace(repos, jobs)
+    screen.show([('workspace', render_workspace(root, summaries))], render_break() + '\n')
+    if not any(summary['changed_total'] for summary in summaries):
+        return None
+    return inq_workspace(root, summaries).execute()
+
+
+def refresh_templates():
+    print(msg_dim("Refreshing .gitignore templates..."))
+    updated, failed = get_template_store().refresh()
+    print(msg_bright(f"{len(updated)} updated") + msg_dim(f"  {len(get_template_store().names())} available, cached in {get_template_store().path}"))
+    for name, error in failed:
+        print(msg_warn(f"! {name}: {error}"))
+
+
+
 # Main function
 def main():
+    global SCOPE
     try:
+        config_start = time.perf_counter()
+        args = parse_cli()
+        profiling.enable_from_env()
+        if args.profile:
+            profiling.enable(args.profile)
+        profiling.origin = START_TIME
+        profiling.record('import', 'phase', START_TIME, config_start)
+        profiling.record('config', 'phase', config_start, time.perf_counter())
+
+        if args.refresh_templates:
+            refresh_templates()
+            return
 
     # load_config()
 
         clear_console()
-        init_git()
-        create_gitignore()
-
-        print_heading()
-        print_history()
-        print_changed()
-        
-
-        # username, email, branch, fetch_user, fetch_repo, push_user, push_repo, changed_files = get_git_details()
+        if args.workspace:
+            with profiling.phase('workspace'):
+                path = run_workspace(args.workspace, args.jobs)
+            if not path:
+                return
+            os.chdir(path)
+            clear_console()
 
-        # print(Fore.BLUE + Style.BRIGHT + f"{username}" + Style.RESET_ALL + f"  {email}")
-        # print(f"  fetch << {Fore.BLUE}{fetch_user}/{Fore.WHITE}{fetch_repo}/{Fore.YELLOW}{branch}" + Style.RESET_ALL)
-        # print(f"  push  >> {Fore.BLUE}{push_user}/{Fore.WHITE}{push_repo}/{Fore.YELLOW}{branch}" + Style.RESET_ALL)
+        with profiling.phase('settings'):
+            origin = os.getcwd()
+            start = enter_toplevel()
+            values = config.load()
+            apply_config(values)
+            try:
+                SCOPE, skipped = resolve_scope(args.paths, origin, start, values['scope'])
+            except ValueError as e:
+                print(msg_err(str(e)))
+                sys.exit(1)
+        if skipped:
+            print(msg_warn(f"Not in the sparse checkout, skipped: {' '.join(skipped)}"))
+            screen.lost()
+
+        with profiling.phase('init check'):
+            prompted = init_git()
+        with profiling.phase('gitignore'):
+            prompted = create_gitignore() or prompted
+        if prompted:
+            # keep the setup answers above the first frame
+            screen.lost()
+
+        if args.watch:
+            run_watch()
+            return
 
+        if args.history:
+            run_history()
+            return
 
-        print_break()
-        # print(Fore.BLUE + Style.BRIGHT + "\nCommit:\n" + Style.RESET_ALL, end="")
-        message = inq_commit.execute()
+        if args.progressive:
+            g, message = run_progressive()
+        else:
+            # the whole first frame is built in memory and written at once
+            with profiling.phase('heading'):
+                try:
+                    g = get_git_details(MAX_CHANGES, SCOPE)
+                except CommandError as e:
+                    # without the change list there's nothing to commit; show
+                    # what can be read from the repo files and stop
+                    screen.show([
+                        ('heading', render_panel('Heading', lambda: render_heading(get_heading_details()))),
+                        ('changes', render_unavailable('Changes', e)),
+                    ], clear=False)
+                    sys.exit(1)
+                heading = render_heading(g)
+            with profiling.phase('history'):
+                history = render_panel('History', lambda: render_history(g))
+            with profiling.phase('changes'):
+                changed = render_panel('Changes', lambda: render_changes_panel(g)) if g['changed_files'] else render_no_changes()
+            screen.show([('heading', heading), ('history', history), ('changes', changed)], render_break() if g['changed_files'] else '', clear=False)
+            report_first_paint()
+            if not g['changed_files']:
+                sys.exit()
+            
+
+            # username, email, branch, fetch_user, fetch_repo, push_user, push_repo, changed_files = get_git_details()
+
+            # print(Fore.BLUE + Style.BRIGHT + f"{username}" + Style.RESET_ALL + f"  {email}")
+            # print(f"  fetch << {Fore.BLUE}{fetch_user}/{Fore.WHITE}{fetch_repo}/{Fore.YELLOW}{branch}" + Style.RESET_ALL)
+            # print(f"  push  >> {Fore.BLUE}{push_user}/{Fore.WHITE}{push_repo}/{Fore.YELLOW}{branch}" + Style.RESET_ALL)
+
+
+            # print(Fore.BLUE + Style.BRIGHT + "\nCommit:\n" + Style.RESET_ALL, end="")
+            with profiling.phase('prompt'):
+                message = inq_commit().execute()
 
         if not message:
             print("\033[A\033[2K", end="")
@@ -525,24 +932,39 @@ def main():
             sys.exit()
 
         try:
-            temp_file = 'temp_commit_message_file.txt'
-            with open(temp_file, 'w') as file:
-                file.write(message)
-
-            run_command(f'git commit -F {temp_file}')
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
-
-            clear_console()
-            print_heading()
-            print_changed(True)
-            print_history(True)
-            print('')
-        except Exception as e:
-            print(msg_err("Error creating commit:" + e))
-
+            with profiling.phase('commit'):
+                result = commit_changes(message)
+        except CommitError as e:
+            print(msg_err(f"Error creating commit: {e}"))
+            sys.exit(1)
+
+        # everything in the summary is already in hand: the heading and change
+        # list from before the commit, the rest from git's reply. The new
+        # commit sits on top of the old branch tip, so it is one more ahead.
+        # Unless that changed the heading, only what's below it is redrawn.
+        with profiling.phase('summary'):
+            after = dict(g)
+            for prefix in ('', 'push_'):
+                if after.get(prefix + 'ahead') is not None:
+                    after[prefix + 'ahead'] += 1
+            screen.printed(message.count('\n') + 4)
+            screen.show([
+                ('heading', render_heading(after)),
+                ('changes', render_changed(g)),
+                ('last', render_commit(result) + '\n'),
+            ])
+
+    except KeyboardInterrupt:
+        cancel_all()
+        print(msg_dim("\nCancelled."))
+        sys.exit(130)
+    except CommandError as e:
+        print(msg_err(f"Error: {e}"))
+        sys.exit(1)
     except Exception as e:
-        print(msg_err("Error:" + e))
+        print(msg_err(f"Error: {e}"))
+    finally:
+        profiling.report()
 
 # Execute main function
 if __name__ == "__main__":
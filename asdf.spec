@@ -8,7 +8,8 @@ a = Analysis(
     ['asdf.py'],
     pathex=[],
     binaries=[],
-    datas=[],
+    # bundled fallback for templates.bundled_dir()
+    datas=[('gitignore_templates/*.gitignore', 'gitignore_templates')],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
@@ -0,0 +1,57 @@
+# -*- mode: python ; coding: utf-8 -*-
+
+# Startup-optimised build of asdf.spec: a one-dir bundle (nothing is
+# re-extracted to a temp dir on every run) without UPX (nothing to
+# decompress at load). Build with `pyinstaller asdf_fast.spec` and point the
+# alias at dist/asdf/asdf.
+
+
+block_cipher = None
+
+
+a = Analysis(
+    ['asdf.py'],
+    pathex=[],
+    binaries=[],
+    # bundled fallback for templates.bundled_dir()
+    datas=[('gitignore_templates/*.gitignore', 'gitignore_templates')],
+    hiddenimports=[],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=['tkinter', 'unittest', 'pydoc', 'doctest'],
+    win_no_prefer_redirects=False,
+    win_private_assemblies=False,
+    cipher=block_cipher,
+    noarchive=False,
+)
+pyz = PYZ(a.pure, a.zipped_data, cipher=block_cipher)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='asdf',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=False,
+    console=True,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
+
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.zipfiles,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='asdf',
+)
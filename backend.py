@@ -0,0 +1,677 @@
+import os
+import re
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import profiling
+
+
+#&                                                                                          COMMANDS
+# Seconds a read-only git command may take before it's killed and reported;
+# GITWELL_TIMEOUT=0 turns the budget off. Commands that write (add, commit)
+# run hooks and have no budget, but can still be cancelled with Ctrl-C.
+TIMEOUT = float(os.environ.get('GITWELL_TIMEOUT') or 10) or None
+
+
+# A git command that failed, ran out of time or was cancelled. `returncode` is
+# None when the command was killed before it finished.
+class CommandError(Exception):
+
+    def __init__(self, command, returncode=None, stderr='', timeout=None):
+        self.command = command if isinstance(command, str) else ' '.join(command)
+        self.returncode = returncode
+        self.stderr = stderr.strip()
+        self.timeout = timeout
+        if timeout:
+            reason = f'timed out after {timeout:g}s'
+        elif returncode is None:
+            reason = 'cancelled'
+        else:
+            reason = self.stderr.split('\n')[-1] if self.stderr else f'exit code {returncode}'
+        super().__init__(f'`{self.command}` {reason}')
+
+
+_running = set()
+_running_lock = threading.Lock()
+
+
+# Children get a session of their own: they can't stop on a terminal read (a
+# credential prompt fails instead), and killing the group takes down whatever
+# they started too (helpers, ssh, hooks).
+def _spawn(args, **kwargs):
+    process = subprocess.Popen(args, start_new_session=True, **kwargs)
+    with _running_lock:
+        _running.add(process)
+    return process
+
+
+def _kill(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+def _reap(process):
+    with _running_lock:
+        _running.discard(process)
+
+
+# Kill every command still running (Ctrl-C); their callers get CommandError
+def cancel_all():
+    with _running_lock:
+        running = list(_running)
+    for process in running:
+        _kill(process)
+
+
+def _decode(data):
+    return data.decode('utf-8', errors='replace')
+
+
+def _communicate(process, command, input, timeout, start):
+    try:
+        output, error = process.communicate(input, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        _kill(process)
+        output, error = process.communicate()
+        profiling.command(command, start, None, len(output), error)
+        raise CommandError(command, None, _decode(error), timeout)
+    except BaseException:
+        _kill(process)
+        process.wait()
+        raise
+    finally:
+        _reap(process)
+    profiling.command(command, start, process.returncode, len(output), error)
+    # killed by cancel_all() from another thread
+    if process.returncode == -signal.SIGKILL:
+        raise CommandError(command, None, _decode(error))
+    return output, error
+
+
+# stderr is kept (not shown) so `--profile` can report why a command failed.
+# With `check`, a non-zero exit raises CommandError with git's message.
+def run_command(command, timeout=TIMEOUT, check=False):
+    start = time.perf_counter()
+    process = _spawn(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
+    output, error = _communicate(process, command, None, timeout, start)
+    if check and process.returncode:
+        raise CommandError(command, process.returncode, _decode(error))
+    return _decode(output).strip()
+
+
+# Run a command (argument list, no shell), feeding `input` on stdin. Returns
+# (exit code, stdout, stderr) as text.
+def run_git(args, input=None, env=None, timeout=TIMEOUT):
+    start = time.perf_counter()
+    process = _spawn(args, stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    output, error = _communicate(process, args, None if input is None else input.encode(), timeout, start)
+    return process.returncode, _decode(output), _decode(error)
+
+
+# Run a git command (argument list, no shell) and yield its output one
+# `sep`-terminated record at a time as it arrives. Closing the generator early
+# kills the process, so callers can stop reading as soon as they have enough.
+# Past `timeout` seconds in total the process is killed and CommandError raised;
+# read to the end, a non-zero exit raises it too unless `check` is off (for
+# commands whose exit code is an answer, like check-ignore).
+def stream_command(args, sep=b'\0', chunk_size=65536, timeout=TIMEOUT, check=True):
+    start = time.perf_counter()
+    # stderr goes to a file so a chatty command can't block on a full pipe
+    errors = tempfile.TemporaryFile()
+    process = _spawn(args, stdout=subprocess.PIPE, stderr=errors)
+    timer = threading.Timer(timeout, _kill, (process,)) if timeout else None
+    if timer:
+        timer.daemon = True
+        timer.start()
+    size = 0
+    try:
+        pending = b''
+        while True:
+            chunk = process.stdout.read1(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            pending += chunk
+            *records, pending = pending.split(sep)
+            for record in records:
+                yield _decode(record)
+        process.wait()
+        if process.returncode == -signal.SIGKILL:
+            timed_out = timer is not None and not timer.is_alive()
+            raise CommandError(args, None, '', timeout if timed_out else None)
+        if check and process.returncode:
+            errors.seek(0)
+            raise CommandError(args, process.returncode, _decode(errors.read()))
+        if pending:
+            yield _decode(pending)
+    finally:
+        if timer:
+            timer.cancel()
+        if process.poll() is None:
+            _kill(process)
+        process.stdout.close()
+        process.wait()
+        _reap(process)
+        errors.seek(0)
+        profiling.command(args, start, process.returncode, size, errors.read())
+        errors.close()
+
+
+
+# Run a small dependency graph of tasks on a thread pool. `tasks` maps a name
+# to `(fn, deps)`; each fn is called with the results so far once all of its
+# deps have finished, so independent git calls overlap and the total is about
+# the longest chain rather than the sum. Returns {name: result}.
+def run_graph(tasks, max_workers=8):
+    results = {}
+    pending = dict(tasks)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        try:
+            while pending or running:
+                for name, (fn, deps) in list(pending.items()):
+                    if all(dep in results for dep in deps):
+                        running[pool.submit(fn, results)] = name
+                        del pending[name]
+                if not running:
+                    raise ValueError(f'unsatisfiable task dependencies: {sorted(pending)}')
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[running.pop(future)] = future.result()
+        except KeyboardInterrupt:
+            # the pool waits for its threads on the way out, and they're
+            # waiting on git
+            for future in running:
+                future.cancel()
+            cancel_all()
+            raise
+    return results
+
+
+
+#&                                                                                          REPO DISCOVERY
+# Find the git dir for `path` the same way `git rev-parse --git-dir` would:
+# honour $GIT_DIR, then walk up looking for a `.git` dir or a `gitdir:` file
+def find_git_dir(path=None):
+    if os.environ.get('GIT_DIR'):
+        git_dir = os.path.abspath(os.environ['GIT_DIR'])
+        return git_dir if os.path.isdir(git_dir) else None
+
+    path = os.path.abspath(path or os.getcwd())
+    while True:
+        candidate = os.path.join(path, '.git')
+        if os.path.isdir(candidate):
+            return candidate
+        if os.path.isfile(candidate):
+            # worktrees and submodules point at their real git dir
+            with open(candidate, 'r') as f:
+                line = f.readline().strip()
+            if line.startswith('gitdir:'):
+                target = line[len('gitdir:'):].strip()
+                return os.path.normpath(os.path.join(path, target))
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+# Linked worktrees keep refs and config in the main repo's git dir
+def find_common_dir(git_dir):
+    commondir_file = os.path.join(git_dir, 'commondir')
+    if os.path.isfile(commondir_file):
+        with open(commondir_file, 'r') as f:
+            return os.path.normpath(os.path.join(git_dir, f.read().strip()))
+    return git_dir
+
+
+
+# Resolve a ref (`HEAD`, `refs/heads/main`, ...) to an object id without git,
+# following symbolic refs and falling back to packed-refs. None if unborn.
+def resolve_ref(ref='HEAD', git_dir=None, depth=0):
+    git_dir = git_dir or find_git_dir()
+    if git_dir is None or depth > 5:
+        return None
+    common_dir = find_common_dir(git_dir)
+    base = git_dir if ref == 'HEAD' or ref.startswith('refs/bisect') else common_dir
+    try:
+        with open(os.path.join(base, ref), 'r') as f:
+            value = f.read().strip()
+    except OSError:
+        value = None
+    if value:
+        if value.startswith('ref:'):
+            return resolve_ref(value[len('ref:'):].strip(), git_dir, depth + 1)
+        return value
+    try:
+        with open(os.path.join(common_dir, 'packed-refs'), 'r') as f:
+            for line in f:
+                if line[0] not in '#^' and line.rstrip('\n').endswith(' ' + ref):
+                    return line.split(' ', 1)[0]
+    except OSError:
+        pass
+    return None
+
+
+
+#&                                                                                          CONFIG PARSER
+_ESCAPES = {'n': '\n', 't': '\t', 'b': '\b', '"': '"', '\\': '\\'}
+
+
+def _parse_value(raw):
+    # Handles quoting, escapes and inline comments for a single (joined) value
+    out = []
+    quoted = False
+    pending_space = ''
+    i = 0
+    while i < len(raw):
+        c = raw[i]
+        if c == '\\' and i + 1 < len(raw):
+            out.append(pending_space + _ESCAPES.get(raw[i + 1], raw[i + 1]))
+            pending_space = ''
+            i += 2
+            continue
+        if c == '"':
+            quoted = not quoted
+        elif not quoted and c in '#;':
+            break
+        elif not quoted and c.isspace():
+            # git keeps inner whitespace, but as plain spaces
+            if out:
+                pending_space += ' '
+        else:
+            out.append(pending_space + c)
+            pending_space = ''
+        i += 1
+    return ''.join(out)
+
+
+def _parse_section(header):
+    # [section "subsection"] or the legacy [section.subsection]
+    match = re.match(r'\s*([\w.-]+)(?:\s+"((?:[^"\\]|\\.)*)")?\s*$', header)
+    if not match:
+        return None
+    name, sub = match.group(1), match.group(2)
+    if sub is not None:
+        return name.lower() + '.' + re.sub(r'\\(.)', r'\1', sub)
+    if '.' in name:
+        section, _, sub = name.partition('.')
+        return section.lower() + '.' + sub.lower()
+    return name.lower()
+
+
+def _config_key(section, name):
+    return section + '.' + name.lower()
+
+
+def parse_config_file(path):
+    # Returns a list of (key, value) pairs in file order; keys are normalised the
+    # way `git config` prints them (section and name lowercased, subsection kept)
+    entries = []
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return entries
+
+    section = None
+    i = 0
+    while i < len(lines):
+        line = lines[i].strip()
+        i += 1
+        if not line or line[0] in '#;':
+            continue
+        if line.startswith('['):
+            end = line.find(']')
+            if end == -1:
+                continue
+            section = _parse_section(line[1:end])
+            line = line[end + 1:].strip()
+            if not line or line[0] in '#;':
+                continue
+        if section is None:
+            continue
+
+        name, sep, raw = line.partition('=')
+        name = name.strip()
+        if not re.match(r'^[A-Za-z][\w-]*$', name):
+            continue
+        if not sep:
+            entries.append((_config_key(section, name), 'true'))
+            continue
+
+        # a trailing backslash continues the value on the next line
+        while raw.endswith('\\') and not raw.endswith('\\\\') and i < len(lines):
+            raw = raw[:-1] + lines[i]
+            i += 1
+        entries.append((_config_key(section, name), _parse_value(raw.strip())))
+    return entries
+
+
+def _glob_to_regex(pattern, ignore_case=False):
+    out = ''
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            out += '(?:.*/)?'
+            i += 3
+        elif pattern.startswith('**', i):
+            out += '.*'
+            i += 2
+        elif pattern[i] == '*':
+            out += '[^/]*'
+            i += 1
+        elif pattern[i] == '?':
+            out += '[^/]'
+            i += 1
+        else:
+            out += re.escape(pattern[i])
+            i += 1
+    return re.compile(out + r'\Z', re.IGNORECASE if ignore_case else 0)
+
+
+def _gitdir_matches(pattern, config_path, git_dir, ignore_case):
+    if pattern.startswith('~/'):
+        pattern = os.path.expanduser(pattern)
+    elif pattern.startswith('./'):
+        pattern = os.path.join(os.path.dirname(config_path), pattern[2:])
+    elif not os.path.isabs(pattern):
+        pattern = '**/' + pattern
+    if pattern.endswith('/'):
+        pattern += '**'
+    target = os.path.realpath(git_dir).replace(os.sep, '/')
+    regex = _glob_to_regex(pattern.replace(os.sep, '/'), ignore_case)
+    return bool(regex.match(target) or regex.match(git_dir.replace(os.sep, '/')))
+
+
+def global_config_files():
+    files = []
+    if not os.environ.get('GIT_CONFIG_NOSYSTEM'):
+        files.append(os.environ.get('GIT_CONFIG_SYSTEM', '/etc/gitconfig'))
+    if 'GIT_CONFIG_GLOBAL' in os.environ:
+        files.append(os.environ['GIT_CONFIG_GLOBAL'])
+    else:
+        xdg = os.environ.get('XDG_CONFIG_HOME') or os.path.join(os.path.expanduser('~'), '.config')
+        files.append(os.path.join(xdg, 'git', 'config'))
+        files.append(os.path.join(os.path.expanduser('~'), '.gitconfig'))
+    return files
+
+
+class GitConfig:
+    # Layered git config: system, global, local and worktree files plus any
+    # `include.path` / `includeIf.<cond>.path` they pull in. Last value wins.
+
+    def __init__(self, git_dir=None, common_dir=None, branch_resolver=None):
+        self.git_dir = git_dir
+        self.common_dir = common_dir or git_dir
+        self.branch_resolver = branch_resolver
+        self.entries = []
+        self.files = []
+
+        for path in global_config_files():
+            self._load(path, 0)
+        if self.common_dir:
+            self._load(os.path.join(self.common_dir, 'config'), 0)
+            if self.get_bool('extensions.worktreeconfig') and self.git_dir:
+                self._load(os.path.join(self.git_dir, 'config.worktree'), 0)
+        self._load_env()
+
+    def _load(self, path, depth):
+        if depth > 10 or not os.path.isfile(path):
+            return
+        self.files.append(path)
+        for key, value in parse_config_file(path):
+            self.entries.append((key, value))
+            if key == 'include.path':
+                self._load(self._resolve_include(path, value), depth + 1)
+            elif key.startswith('includeif.') and key.endswith('.path'):
+                condition = key[len('includeif.'):-len('.path')]
+                if self._condition_holds(condition, path):
+                    self._load(self._resolve_include(path, value), depth + 1)
+
+    def _load_env(self):
+        try:
+            count = int(os.environ.get('GIT_CONFIG_COUNT', '0'))
+        except ValueError:
+            return
+        for i in range(count):
+            key = os.environ.get(f'GIT_CONFIG_KEY_{i}')
+            if key:
+                section, _, name = key.rpartition('.')
+                head, _, sub = section.partition('.')
+                section = head.lower() + ('.' + sub if sub else '')
+                self.entries.append((_config_key(section, name), os.environ.get(f'GIT_CONFIG_VALUE_{i}', '')))
+
+    def _resolve_include(self, config_path, value):
+        value = os.path.expanduser(value)
+        if not os.path.isabs(value):
+            value = os.path.join(os.path.dirname(config_path), value)
+        return value
+
+    def _condition_holds(self, condition, config_path):
+        if condition.startswith('gitdir:') and self.git_dir:
+            return _gitdir_matches(condition[len('gitdir:'):], config_path, self.git_dir, False)
+        if condition.startswith('gitdir/i:') and self.git_dir:
+            return _gitdir_matches(condition[len('gitdir/i:'):], config_path, self.git_dir, True)
+        if condition.startswith('onbranch:') and self.branch_resolver:
+            branch = self.branch_resolver()
+            pattern = condition[len('onbranch:'):]
+            if pattern.endswith('/'):
+                pattern += '**'
+            return bool(branch) and bool(_glob_to_regex(pattern).match(branch))
+        return False
+
+    def get(self, key, default=None):
+        section, _, name = key.rpartition('.')
+        head, _, sub = section.partition('.')
+        key = head.lower() + ('.' + sub if sub else '') + '.' + name.lower()
+        for entry_key, value in reversed(self.entries):
+            if entry_key == key:
+                return value
+        return default
+
+    def get_bool(self, key):
+        return (self.get(key) or '').lower() in ('true', 'yes', 'on', '1')
+
+    def items(self, prefix):
+        return [(key, value) for key, value in self.entries if key.startswith(prefix)]
+
+
+
+#&                                                                                          BACKENDS
+class GitBackend:
+    # The lookups `get_git_details` needs to draw the heading. Every backend
+    # returns '' where `git` itself would print nothing (no remote, detached HEAD).
+    name = 'base'
+
+    def config(self, key):
+        raise NotImplementedError
+
+    def branch(self):
+        raise NotImplementedError
+
+    def remote_url(self, remote='origin', push=False):
+        raise NotImplementedError
+
+    def toplevel(self):
+        raise NotImplementedError
+
+
+class SubprocessBackend(GitBackend):
+    name = 'subprocess'
+
+    def config(self, key):
+        return run_command(f'git config {key}')
+
+    def branch(self):
+        return run_command('git symbolic-ref --short HEAD')
+
+    def remote_url(self, remote='origin', push=False):
+        return run_command(f'git remote get-url {"--push " if push else ""}{remote}')
+
+    def toplevel(self):
+        return run_command('git rev-parse --show-toplevel')
+
+
+class FileBackend(GitBackend):
+    # Reads `.git/HEAD` and the layered config files directly, no process spawns
+    name = 'file'
+
+    def __init__(self, path=None):
+        self.git_dir = find_git_dir(path)
+        if self.git_dir is None:
+            raise RuntimeError('not a git repository')
+        self.common_dir = find_common_dir(self.git_dir)
+        self._config = None
+
+    @property
+    def git_config(self):
+        if self._config is None:
+            self._config = GitConfig(self.git_dir, self.common_dir, self.branch)
+        return self._config
+
+    def head(self):
+        try:
+            with open(os.path.join(self.git_dir, 'HEAD'), 'r') as f:
+                return f.read().strip()
+        except OSError:
+            return ''
+
+    def config(self, key):
+        return self.git_config.get(key, '')
+
+    def branch(self):
+        head = self.head()
+        if head.startswith('ref:'):
+            ref = head[len('ref:'):].strip()
+            if ref.startswith('refs/heads/'):
+                return ref[len('refs/heads/'):]
+            return ref
+        return ''
+
+    def _rewrite_url(self, url, kind):
+        # url.<base>.insteadOf / pushInsteadOf, longest matching prefix wins
+        best, best_len = None, 0
+        suffix = '.' + kind
+        for key, value in self.git_config.items('url.'):
+            if key.endswith(suffix) and url.startswith(value) and len(value) > best_len:
+                best, best_len = key[len('url.'):-len(suffix)], len(value)
+        return best + url[best_len:] if best is not None else None
+
+    def remote_url(self, remote='origin', push=False):
+        url = self.config(f'remote.{remote}.url')
+        if push:
+            push_url = self.config(f'remote.{remote}.pushurl')
+            if push_url:
+                return self._rewrite_url(push_url, 'insteadof') or push_url
+            if url:
+                rewritten = self._rewrite_url(url, 'pushinsteadof')
+                if rewritten:
+                    return rewritten
+        if not url:
+            return ''
+        return self._rewrite_url(url, 'insteadof') or url
+
+    def toplevel(self):
+        work_tree = os.environ.get('GIT_WORK_TREE') or self.config('core.worktree')
+        if work_tree:
+            return os.path.normpath(os.path.join(self.git_dir, work_tree))
+        if os.path.basename(self.git_dir) == '.git':
+            return os.path.dirname(self.git_dir)
+        gitdir_file = os.path.join(self.git_dir, 'gitdir')
+        if os.path.isfile(gitdir_file):
+            # linked worktree: `gitdir` holds the path of the worktree's .git file
+            with open(gitdir_file, 'r') as f:
+                return os.path.dirname(f.read().strip())
+        return os.path.dirname(self.git_dir)
+
+
+class Pygit2Backend(GitBackend):
+    name = 'pygit2'
+
+    def __init__(self, path=None):
+        import pygit2
+        self.repo = pygit2.Repository(pygit2.discover_repository(path or os.getcwd()))
+
+    def config(self, key):
+        try:
+            return str(self.repo.config[key])
+        except KeyError:
+            return ''
+
+    def branch(self):
+        if self.repo.head_is_detached:
+            return ''
+        target = self.repo.references['HEAD'].target
+        return target[len('refs/heads/'):] if target.startswith('refs/heads/') else target
+
+    def remote_url(self, remote='origin', push=False):
+        try:
+            remote = self.repo.remotes[remote]
+        except (KeyError, ValueError):
+            return ''
+        return (remote.push_url if push else None) or remote.url or ''
+
+    def toplevel(self):
+        return (self.repo.workdir or '').rstrip('/')
+
+
+class DulwichBackend(GitBackend):
+    # Dulwich does not follow `include.path`, so it is only used when asked for
+    name = 'dulwich'
+
+    def __init__(self, path=None):
+        from dulwich.repo import Repo
+        self.repo = Repo.discover(path or os.getcwd())
+        self.stack = self.repo.get_config_stack()
+
+    def config(self, key):
+        section, _, name = key.rpartition('.')
+        head, _, sub = section.partition('.')
+        section = (head.encode(), sub.encode()) if sub else (head.encode(),)
+        try:
+            return self.stack.get(section, name.encode()).decode()
+        except KeyError:
+            return ''
+
+    def branch(self):
+        ref = self.repo.refs.read_ref(b'HEAD') or b''
+        if ref.startswith(b'ref: refs/heads/'):
+            return ref[len(b'ref: refs/heads/'):].decode()
+        return ''
+
+    def remote_url(self, remote='origin', push=False):
+        return (self.config(f'remote.{remote}.pushurl') if push else '') or self.config(f'remote.{remote}.url')
+
+    def toplevel(self):
+        return self.repo.path.rstrip('/')
+
+
+BACKENDS = {
+    'subprocess': SubprocessBackend,
+    'file': FileBackend,
+    'pygit2': Pygit2Backend,
+    'dulwich': DulwichBackend,
+}
+
+
+# $GITWELL_BACKEND picks a backend by name; the default prefers pygit2 when it is
+# installed and otherwise reads the repo files directly. Anything that fails to
+# open the repo falls back to plain `git` subprocesses.
+def get_backend(name=None, path=None):
+    name = name or os.environ.get('GITWELL_BACKEND', 'auto')
+    order = ['pygit2', 'file'] if name == 'auto' else [name]
+    for candidate in order:
+        backend_class = BACKENDS.get(candidate)
+        if backend_class is None or backend_class is SubprocessBackend:
+            continue
+        try:
+            return backend_class(path)
+        except Exception:
+            continue
+    return SubprocessBackend()
@@ -0,0 +1,299 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+#&                                                                                          SYNTHETIC REPOS
+# Everything runs against throwaway local repos, so no network is needed
+GIT_ENV = {
+    'GIT_AUTHOR_NAME': 'Bench User',
+    'GIT_AUTHOR_EMAIL': 'bench@example.com',
+    'GIT_COMMITTER_NAME': 'Bench User',
+    'GIT_COMMITTER_EMAIL': 'bench@example.com',
+    'GITWELL_OFFLINE': '1',
+}
+
+
+def git(repo, *args, stdin=None):
+    return subprocess.run(['git', *args], cwd=repo, input=stdin, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE).stdout
+
+
+def file_path(i):
+    # ~100 files per directory, like a real tree
+    return f'src/pkg{i // 100:04d}/module_{i:06d}.txt'
+
+
+def file_content(i, revision=0):
+    return ''.join(f'line {n} of file {i} (rev {revision})\n' for n in range(10)).encode()
+
+
+def _blob(out, data):
+    out.append(b'data %d\n' % len(data))
+    out.append(data)
+    out.append(b'\n')
+
+
+# History is written with `git fast-import` in one stream: the first commit
+# adds every file, each later one edits a random file, so a deep history of a
+# 100k-file tree builds in seconds rather than one `git commit` at a time
+def write_history(repo, files, depth, rng):
+    out = []
+    stamp = 1700000000
+    for commit in range(depth):
+        out.append(b'commit refs/heads/main\n')
+        out.append(b'committer Bench User <bench@example.com> %d +0000\n' % (stamp + commit * 60))
+        message = f'Commit {commit}\n\nSynthetic change number {commit}.\n\n- one\n- two\n'.encode()
+        _blob(out, message)
+        if commit == 0:
+            for i in range(files):
+                out.append(f'M 100644 inline {file_path(i)}\n'.encode())
+                _blob(out, file_content(i))
+        else:
+            i = rng.randrange(files)
+            out.append(f'M 100644 inline {file_path(i)}\n'.encode())
+            _blob(out, file_content(i, commit))
+        out.append(b'\n')
+    git(repo, 'fast-import', '--quiet', stdin=b''.join(out))
+
+
+# A repo with `depth` commits over `files` files, plus pending changes:
+# `changes` edited files, `binaries` new binary files and `renames` renamed
+# files, all staged (as if by an earlier `git add`)
+def build_repo(repo, files=1000, depth=100, changes=10, binaries=2, renames=2, seed=0):
+    rng = random.Random(seed)
+    os.makedirs(repo, exist_ok=True)
+    git(repo, 'init', '-q', '-b', 'main')
+    git(repo, 'config', 'user.name', 'Bench User')
+    git(repo, 'config', 'user.email', 'bench@example.com')
+    if depth:
+        write_history(repo, files, depth, rng)
+        git(repo, 'checkout', '-q', '-f', 'main')
+
+    picked = rng.sample(range(files), min(files, changes + renames)) if depth else []
+    for i in picked[:changes]:
+        with open(os.path.join(repo, file_path(i)), 'ab') as f:
+            f.write(b'edited for the benchmark\n' * rng.randint(1, 20))
+    for i in picked[changes:]:
+        git(repo, 'mv', file_path(i), file_path(i).replace('module_', 'renamed_'))
+    os.makedirs(os.path.join(repo, 'assets'), exist_ok=True)
+    for i in range(binaries):
+        with open(os.path.join(repo, 'assets', f'blob_{i}.bin'), 'wb') as f:
+            f.write(b'\0' + rng.randbytes(64 * 1024))
+    with open(os.path.join(repo, '.gitignore'), 'w') as f:
+        f.write('*.log\n')
+    git(repo, 'add', '-A')
+
+
+
+#&                                                                                          TIMING
+spawns = [0]
+
+
+# Count every child process, whichever helper started it
+def count_spawns():
+    original = subprocess.Popen.__init__
+
+    def counting_init(self, *args, **kwargs):
+        spawns[0] += 1
+        original(self, *args, **kwargs)
+
+    subprocess.Popen.__init__ = counting_init
+
+
+# cold: in-process caches and the .git/gitwell snapshot are dropped before each
+# run; warm: the phase runs once first and is measured with everything cached
+def reset_caches(asdf, repo):
+    import details
+    from cache import clear_caches
+    clear_caches()
+    asdf.get_common_style.cache_clear()
+    details.snapshot = None
+    asdf.render_cache = None
+    shutil.rmtree(os.path.join(repo, '.git', 'gitwell'), ignore_errors=True)
+
+
+def call_quietly(fn):
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            fn()
+        except SystemExit:
+            pass
+
+
+def measure(fn, repeat, before=None):
+    times = []
+    counts = []
+    for _ in range(repeat):
+        if before:
+            before()
+        start_spawns = spawns[0]
+        start = time.perf_counter()
+        call_quietly(fn)
+        times.append((time.perf_counter() - start) * 1000)
+        counts.append(spawns[0] - start_spawns)
+    return {
+        'median_ms': round(statistics.median(times), 3),
+        'min_ms': round(min(times), 3),
+        'max_ms': round(max(times), 3),
+        'spawns': max(counts),
+    }
+
+
+def with_style(asdf, style, fn):
+    def run():
+        previous = asdf.HISTORY_STYLE
+        asdf.HISTORY_STYLE = style
+        try:
+            fn()
+        finally:
+            asdf.HISTORY_STYLE = previous
+    return run
+
+
+# Commit everything, then put HEAD and the index back so the next run sees
+# the same changes again
+def commit_phase(asdf, repo):
+    index = os.path.join(repo, '.git', 'index')
+
+    def run():
+        head = git(repo, 'rev-parse', 'HEAD').decode().strip()
+        shutil.copy2(index, index + '.bench')
+        try:
+            asdf.commit_changes('Benchmark commit\n\nbody')
+        finally:
+            git(repo, 'update-ref', 'refs/heads/main', head)
+            os.replace(index + '.bench', index)
+    return run
+
+
+def run_phases(repo, repeat):
+    os.environ.update(GIT_ENV)
+    count_spawns()
+    os.chdir(repo)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import asdf
+
+    phases = [
+        ('init_git', asdf.init_git),
+        ('get_git_details', lambda: asdf.get_git_details(asdf.MAX_CHANGES)),
+        ('print_heading', asdf.print_heading),
+    ]
+    for style in (1, 2, 3):
+        phases.append((f'print_history[style={style}]', with_style(asdf, style, asdf.print_history)))
+    phases.append(('print_changed', asdf.print_changed))
+
+    results = {}
+    for name, fn in phases:
+        cold = measure(fn, repeat, before=lambda: reset_caches(asdf, repo))
+        call_quietly(fn)
+        results[name] = {'cold': cold, 'warm': measure(fn, repeat)}
+    results['commit'] = {'cold': measure(commit_phase(asdf, repo), repeat, before=lambda: reset_caches(asdf, repo))}
+    return results
+
+
+
+#&                                                                                          REPORT
+def git_version():
+    return subprocess.run(['git', '--version'], stdout=subprocess.PIPE).stdout.decode().strip()
+
+
+# Phases whose median got slower than `threshold` (0.2 = 20%) against a
+# previous run, or that spawn more processes than before
+def compare(baseline, current, threshold):
+    regressions = []
+    if baseline.get('params') != current['params']:
+        print(f"warning: baseline was run with {baseline.get('params')}", file=sys.stderr)
+    for name, modes in current['results'].items():
+        for mode, result in modes.items():
+            before = baseline.get('results', {}).get(name, {}).get(mode)
+            if not before or not result:
+                continue
+            if result['median_ms'] > before['median_ms'] * (1 + threshold):
+                regressions.append(f"{name} ({mode}): {before['median_ms']:.1f} -> {result['median_ms']:.1f} ms")
+            if result['spawns'] > before['spawns']:
+                regressions.append(f"{name} ({mode}): {before['spawns']} -> {result['spawns']} processes")
+    return regressions
+
+
+def print_table(report, file=sys.stderr):
+    print(f"{'phase':<26}{'cold ms':>10}{'warm ms':>10}{'spawns':>9}", file=file)
+    for name, modes in report['results'].items():
+        cold = modes['cold']
+        warm = modes.get('warm')
+        warm_ms = f"{warm['median_ms']:.1f}" if warm else '-'
+        spawned = f"{cold['spawns']}/{warm['spawns']}" if warm else f"{cold['spawns']}"
+        print(f"{name:<26}{cold['median_ms']:>10.1f}{warm_ms:>10}{spawned:>9}", file=file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='bench.py', description='Time each asdf phase against a synthetic repo.')
+    parser.add_argument('--files', type=int, default=1000, help='tracked files')
+    parser.add_argument('--depth', type=int, default=100, help='commits of history')
+    parser.add_argument('--changes', type=int, default=10, help='edited files staged for commit')
+    parser.add_argument('--binaries', type=int, default=2, help='new binary files')
+    parser.add_argument('--renames', type=int, default=2, help='renamed files')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5, help='runs per phase (median is reported)')
+    parser.add_argument('--repo', help='build the repo here and keep it (default: a temp dir)')
+    parser.add_argument('--output', '-o', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='previous JSON results to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown before --compare fails (default 0.2)')
+    args = parser.parse_args(argv)
+
+    params = {key: getattr(args, key) for key in ('files', 'depth', 'changes', 'binaries', 'renames', 'seed', 'repeat')}
+    temp_dir = None
+    repo = args.repo
+    if repo is None:
+        temp_dir = tempfile.mkdtemp(prefix='gitwell-bench-')
+        repo = temp_dir
+    repo = os.path.abspath(repo)
+
+    try:
+        start = time.perf_counter()
+        build_repo(repo, args.files, args.depth, args.changes, args.binaries, args.renames, args.seed)
+        print(f"built {args.files} files x {args.depth} commits in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+        report = {
+            'params': params,
+            'env': {
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'git': git_version(),
+                'backend': os.environ.get('GITWELL_BACKEND', 'auto'),
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            },
+            'results': run_phases(repo, args.repeat),
+        }
+    finally:
+        if temp_dir:
+            os.chdir('/')
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print_table(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+    else:
+        print(json.dumps(report, indent=1))
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        for line in regressions:
+            print(f"regression: {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
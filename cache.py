@@ -0,0 +1,217 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from backend import GitConfig, find_common_dir, find_git_dir, global_config_files
+
+
+#&                                                                                          STATE FILES
+def file_state(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+# The files a repo snapshot is read from: HEAD, the current ref (loose or
+# packed), the index and every config file git would consult, includes too
+def state_files(git_dir, index=True, config=True):
+    common_dir = find_common_dir(git_dir)
+    files = [os.path.join(git_dir, 'HEAD'), os.path.join(common_dir, 'packed-refs')]
+    try:
+        with open(files[0], 'r') as f:
+            head = f.read().strip()
+        if head.startswith('ref:'):
+            files.append(os.path.join(common_dir, head[len('ref:'):].strip()))
+    except OSError:
+        pass
+    if index:
+        files.append(os.path.join(git_dir, 'index'))
+    if config:
+        git_config = GitConfig(git_dir, common_dir)
+        files.append(os.path.join(common_dir, 'config'))
+        # missing global files are keyed too, so creating one invalidates
+        for path in global_config_files() + git_config.files:
+            if path not in files:
+                files.append(path)
+    return files
+
+
+
+# A cheap token for the repo's current state, for `useCache(state=...)`
+def repo_state(index=True, config=False):
+    def token():
+        git_dir = find_git_dir()
+        if git_dir is None:
+            return None
+        return tuple(tuple(file_state(path) or ()) for path in state_files(git_dir, index, config))
+    return token
+
+
+
+#&                                                                                          MEMO CACHE
+_caches = {}
+
+
+def _make_key(args, kwargs):
+    key = args
+    if kwargs:
+        key += (object,) + tuple(sorted(kwargs.items()))
+    hash(key)
+    return key
+
+
+# Memoise a function in a bounded, thread-safe LRU. Entries are dropped when
+# `state()` (e.g. `repo_state()`) returns a different token than the one they
+# were stored with, or after `cache_time` ms if one is given. Calls with
+# unhashable arguments skip the cache. `wrapper.cache_info()` reports hits,
+# misses, evictions and invalidations; `cache_stats()` collects them all.
+def useCache(cache_time=None, max_size=128, state=None):
+    def decorator(func):
+        cache = OrderedDict()
+        lock = threading.RLock()
+        stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                key = _make_key(args, kwargs)
+            except TypeError:
+                with lock:
+                    stats['misses'] += 1
+                return func(*args, **kwargs)
+
+            token = state() if state else None
+            with lock:
+                entry = cache.get(key)
+                if entry is not None:
+                    result, cached_time, cached_token = entry
+                    expired = cache_time is not None and time.monotonic() - cached_time > cache_time / 1000
+                    if expired or cached_token != token:
+                        del cache[key]
+                        stats['invalidations'] += 1
+                    else:
+                        cache.move_to_end(key)
+                        stats['hits'] += 1
+                        return result
+                stats['misses'] += 1
+
+            result = func(*args, **kwargs)
+            with lock:
+                cache[key] = (result, time.monotonic(), token)
+                cache.move_to_end(key)
+                while len(cache) > max_size:
+                    cache.popitem(last=False)
+                    stats['evictions'] += 1
+            return result
+
+        def cache_info():
+            with lock:
+                return dict(stats, size=len(cache), max_size=max_size)
+
+        def cache_clear():
+            with lock:
+                cache.clear()
+
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        _caches[func.__qualname__] = wrapper
+        return wrapper
+    return decorator
+
+
+def cache_stats():
+    return {name: wrapper.cache_info() for name, wrapper in _caches.items()}
+
+
+def clear_caches():
+    for wrapper in _caches.values():
+        wrapper.cache_clear()
+
+
+
+#&                                                                                          SNAPSHOT CACHE
+# Per-repo JSON cache under `.git/gitwell/`. Each entry remembers the
+# (mtime, size) of the files it was built from and is only returned while all
+# of them are unchanged; stale entries are dropped on save, and the file is
+# capped by entry count and size with least-recently-used entries going first.
+class SnapshotCache:
+    # One instance is shared by the threads of run_graph and --progressive,
+    # so every read and write of the entries holds the lock
+
+    def __init__(self, git_dir=None, max_entries=16, max_bytes=512 * 1024, name='snapshot.json'):
+        self.git_dir = git_dir if git_dir is not None else find_git_dir()
+        self.path = os.path.join(self.git_dir, 'gitwell', name) if self.git_dir else None
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = None
+        self._dirty = False
+        self._lock = threading.RLock()
+
+    @property
+    def entries(self):
+        with self._lock:
+            if self._entries is None:
+                self._entries = {}
+                if self.path:
+                    try:
+                        with open(self.path, 'r') as f:
+                            self._entries = json.load(f)
+                    except (OSError, ValueError):
+                        pass
+            return self._entries
+
+    def key(self, files):
+        return {path: file_state(path) for path in files}
+
+    def get(self, name, key):
+        with self._lock:
+            entry = self.entries.get(name)
+            if entry is None or entry['key'] != key:
+                return None
+            entry['used'] = time.time()
+            self._dirty = True
+            return entry['value']
+
+    def put(self, name, value, key):
+        with self._lock:
+            self.entries[name] = {'key': key, 'value': value, 'used': time.time()}
+            self._dirty = True
+
+    def _evict(self):
+        for name, entry in list(self.entries.items()):
+            if self.key(entry['key']) != entry['key']:
+                del self.entries[name]
+
+        by_age = sorted(self.entries, key=lambda name: self.entries[name]['used'])
+        while len(by_age) > self.max_entries:
+            del self.entries[by_age.pop(0)]
+
+        # sizes are counted per entry so a big file isn't re-encoded per eviction
+        sizes = {name: len(json.dumps(name)) + len(json.dumps(self.entries[name])) + 4 for name in by_age}
+        size = sum(sizes.values())
+        while size > self.max_bytes and by_age:
+            name = by_age.pop(0)
+            size -= sizes[name]
+            del self.entries[name]
+        return json.dumps(self.entries)
+
+    def save(self):
+        with self._lock:
+            if not self.path or not self._dirty:
+                return
+            data = self._evict()
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                # unique per process and thread, so concurrent writers never share one
+                temp_path = f'{self.path}.{os.getpid()}.{threading.get_ident()}.tmp'
+                with open(temp_path, 'w') as f:
+                    f.write(data)
+                os.replace(temp_path, self.path)
+                self._dirty = False
+            except OSError:
+                pass
@@ -0,0 +1,686 @@
+import heapq
+import os
+import re
+import shlex
+import sys
+from array import array
+
+from backend import CommandError, find_git_dir, get_backend, run_git, stream_command, resolve_ref
+
+
+STATUS_KEYS = ('M', 'A', 'D', 'R')
+EMPTY_TREE = '4b825dc642cb6eb9a060e54bf8d69288fbee4904'
+
+
+#&                                                                                          PARSERS
+# Records from `git status --porcelain=v2 -z`, reduced to the status a file
+# would have in a commit of everything (HEAD -> worktree): untracked files are
+# 'A', staged renames keep their 'R<score>', copies count as 'A', and a file
+# added to the index then deleted from the worktree is no change at all
+def iter_status(tokens):
+    tokens = iter(tokens)
+    for token in tokens:
+        if not token or token[0] in '#!':
+            continue
+        kind = token[0]
+        if kind == '?':
+            yield 'A', token[2:], None
+        elif kind == '1':
+            fields = token.split(' ', 8)
+            x, y = fields[1]
+            if y == 'D':
+                if x != 'A':
+                    yield 'D', fields[8], None
+            elif x in 'AD':
+                yield x, fields[8], None
+            else:
+                yield 'M', fields[8], None
+        elif kind == '2':
+            fields = token.split(' ', 9)
+            old_path = next(tokens, '')
+            # copies (status.renames=copies) are new files as far as counts go
+            if fields[8][0] == 'C':
+                yield 'A', fields[9], None
+            else:
+                yield fields[8], fields[9], old_path
+        elif kind == 'u':
+            yield 'M', token.split(' ', 10)[10], None
+
+
+# Records from `git diff --numstat -z`: `adds\tdels\tpath`, or `adds\tdels\t`
+# followed by the old and new paths for a rename. Binary files report '-'.
+def iter_numstat(tokens):
+    tokens = iter(tokens)
+    for token in tokens:
+        if not token:
+            continue
+        additions, deletions, path = token.split('\t', 2)
+        if not path:
+            next(tokens, '')
+            path = next(tokens, '')
+        yield path, additions, deletions
+
+
+def _count(value):
+    return 0 if value == '-' else int(value)
+
+
+# Line count of an untracked file, as numstat would report it; binaries are 0
+def count_lines(path, chunk_size=1 << 20):
+    lines = 0
+    last = b'\n'
+    try:
+        with open(path, 'rb') as f:
+            chunk = f.read(8000)
+            if b'\0' in chunk:
+                return 0
+            while chunk:
+                lines += chunk.count(b'\n')
+                last = chunk[-1:]
+                chunk = f.read(chunk_size)
+    except OSError:
+        return 0
+    return lines + (last != b'\n')
+
+
+
+#&                                                                                          CHANGE SET
+ROLLUP_ROWS = 5
+REMOVED = 255
+
+
+# Every changed path in a few flat columns instead of a dict per file: a
+# status code and a directory id per row in arrays, interned basenames, and a
+# table of directories. Status counts are kept per directory (and for every
+# directory above it) as rows are added, so totals and directory rollups cost
+# as much as the directories involved, not the files.
+class ChangeSet:
+    __slots__ = ('codes', 'dir_ids', 'names', 'renames', 'dirs', 'dir_index', 'parents', 'children', 'direct', 'subtree', 'size', '_rows')
+
+    def __init__(self):
+        self.codes = array('B')
+        self.dir_ids = array('I')
+        self.names = []
+        self.renames = {}
+        self.dirs = ['']
+        self.dir_index = {'': 0}
+        self.parents = [0]
+        self.children = [[]]
+        # per directory, per status key: [M, A, D, R] for dir 0, then dir 1...
+        self.direct = array('I', [0] * len(STATUS_KEYS))
+        self.subtree = array('I', [0] * len(STATUS_KEYS))
+        self.size = 0
+        self._rows = None
+
+    def __len__(self):
+        return self.size
+
+    def _dir_id(self, directory):
+        dir_id = self.dir_index.get(directory)
+        if dir_id is None:
+            parent = self._dir_id(directory.rpartition('/')[0])
+            dir_id = len(self.dirs)
+            self.dirs.append(sys.intern(directory))
+            self.dir_index[self.dirs[-1]] = dir_id
+            self.parents.append(parent)
+            self.children.append([])
+            self.children[parent].append(dir_id)
+            self.direct.extend([0] * len(STATUS_KEYS))
+            self.subtree.extend([0] * len(STATUS_KEYS))
+        return dir_id
+
+    def _count(self, dir_id, code, step):
+        self.direct[dir_id * len(STATUS_KEYS) + code] += step
+        while True:
+            self.subtree[dir_id * len(STATUS_KEYS) + code] += step
+            if dir_id == 0:
+                break
+            dir_id = self.parents[dir_id]
+
+    def path(self, row):
+        directory = self.dirs[self.dir_ids[row]]
+        return f'{directory}/{self.names[row]}' if directory else self.names[row]
+
+    def add(self, status, path, old_path=None):
+        code = STATUS_KEYS.index('R' if status[0] == 'R' else status[0])
+        directory, _, name = path.rpartition('/')
+        dir_id = self._dir_id(directory)
+        row = len(self.codes)
+        self.codes.append(code)
+        self.dir_ids.append(dir_id)
+        self.names.append(sys.intern(name))
+        if old_path or status != STATUS_KEYS[code]:
+            self.renames[row] = (status, old_path)
+        if self._rows is not None:
+            self._rows[path] = row
+        self._count(dir_id, code, 1)
+        self.size += 1
+
+    def discard(self, path):
+        if self._rows is None:
+            self._rows = {self.path(row): row for row in range(len(self.codes)) if self.codes[row] != REMOVED}
+        row = self._rows.pop(path, None)
+        if row is None:
+            return
+        self._count(self.dir_ids[row], self.codes[row], -1)
+        self.codes[row] = REMOVED
+        self.renames.pop(row, None)
+        self.size -= 1
+
+    # (status, path, old_path) for every row, in the order they were added
+    def __iter__(self):
+        for row, code in enumerate(self.codes):
+            if code != REMOVED:
+                status, old_path = self.renames.get(row, (STATUS_KEYS[code], None))
+                yield status, self.path(row), old_path
+
+    def counts(self, dir_id=0):
+        return dict(zip(STATUS_KEYS, self.subtree[dir_id * len(STATUS_KEYS):(dir_id + 1) * len(STATUS_KEYS)]))
+
+    # At most `max_rows` directories that together cover every change. The
+    # biggest directory is split into its subdirectories (plus its own files)
+    # for as long as that fits; when it doesn't, its biggest parts are kept
+    # and the rest is lumped together. Returns [{path, kind, total, counts}]
+    # with kind 'tree' (everything under path), 'files' (files directly in
+    # it) or 'rest' (what's left of it after the directories listed).
+    def rollup(self, max_rows=ROLLUP_ROWS):
+        width = len(STATUS_KEYS)
+
+        def entry(dir_id, kind, counts):
+            return {'dir': dir_id, 'kind': kind, 'counts': list(counts), 'total': sum(counts)}
+
+        def parts(dir_id):
+            found = [entry(child, 'tree', self.subtree[child * width:(child + 1) * width]) for child in self.children[dir_id]]
+            found.append(entry(dir_id, 'files', self.direct[dir_id * width:(dir_id + 1) * width]))
+            return sorted((part for part in found if part['total']), key=lambda part: -part['total'])
+
+        entries = [entry(0, 'tree', self.subtree[:width])]
+        while True:
+            splittable = [e for e in entries if e['kind'] == 'tree' and any(self.subtree[child * width:(child + 1) * width].count(0) < width for child in self.children[e['dir']])]
+            if not splittable:
+                break
+            biggest = max(splittable, key=lambda e: e['total'])
+            split = parts(biggest['dir'])
+            slots = max_rows - len(entries) + 1
+            if len(split) > slots:
+                if slots < 2:
+                    break
+                rest = split[slots - 1:]
+                split = split[:slots - 1] + [entry(biggest['dir'], 'rest', [sum(part['counts'][i] for part in rest) for i in range(width)])]
+            entries.remove(biggest)
+            entries.extend(split)
+
+        rollup = []
+        for e in sorted(entries, key=lambda e: -e['total']):
+            directory = self.dirs[e['dir']]
+            rollup.append({
+                'path': directory + '/' if directory else './',
+                'kind': e['kind'],
+                'total': e['total'],
+                'counts': dict(zip(STATUS_KEYS, e['counts'])),
+            })
+        return rollup
+
+
+
+#&                                                                                          SCOPE
+# A scope is a tuple of paths relative to the top of the repo; () is the whole
+# repo. Status, staging, the commit and the history panel are all limited to it.
+
+# Directories a cone-mode sparse checkout has fully checked out, or None when
+# the checkout isn't sparse (non-cone patterns aren't read)
+def sparse_dirs(git_dir=None):
+    git_dir = git_dir or find_git_dir()
+    backend = get_backend()
+    if not git_dir or backend.config('core.sparseCheckout').lower() != 'true' or backend.config('core.sparseCheckoutCone').lower() != 'true':
+        return None
+    try:
+        with open(os.path.join(git_dir, 'info', 'sparse-checkout'), 'r') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    # cone patterns: `/dir/` takes a directory, `!/dir/*/` then drops its
+    # subdirectories again, leaving only its own files
+    dirs, partial = set(), set()
+    for line in lines:
+        line = line.strip()
+        if line.startswith('!/') and line.endswith('/*/'):
+            partial.add(line[2:-3])
+        elif line.startswith('/') and line.endswith('/') and line != '/':
+            dirs.add(line[1:-1])
+    return sorted(dirs - partial)
+
+
+# Whether `path` has anything checked out in a cone with fully checked out
+# `dirs`: files at the top are always there, directories above a cone dir
+# have their own files
+def in_sparse_checkout(path, dirs):
+    path = path.rstrip('/')
+    if '/' not in path and not os.path.isdir(path):
+        return True
+    return any(path == d or path.startswith(d + '/') or d.startswith(path + '/') for d in dirs)
+
+
+# A run started below the top of the repo works from the top, scoped to the
+# directory it was started in. Returns that directory; '' at the top or
+# outside of a repo.
+def enter_toplevel():
+    if os.path.isdir('.git') or find_git_dir() is None:
+        return ''
+    top = get_backend().toplevel()
+    start = os.path.relpath(os.getcwd(), top) if top else '.'
+    if start == '.':
+        return ''
+    os.chdir(top)
+    return start
+
+
+# The scope is `paths` (relative to `origin`, where the run started), else the
+# directory it was started in, else the `scope` setting (relative to the top).
+# Call from the top of the repo. Returns (scope, skipped): paths with nothing
+# in a sparse checkout are left out. ValueError for paths outside the repo or
+# when nothing in scope is checked out.
+def resolve_scope(paths, origin, start='', setting=''):
+    if paths:
+        scope = [os.path.relpath(os.path.join(origin, path)) for path in paths]
+    elif start:
+        scope = [start]
+    else:
+        scope = shlex.split(setting or '')
+    scope = sorted(set(os.path.normpath(path) for path in scope))
+
+    outside = [path for path in scope if path == '..' or path.startswith('..' + os.sep)]
+    if outside:
+        raise ValueError(f"Outside of the repository: {' '.join(outside)}")
+    if '.' in scope:
+        return (), []
+
+    skipped = []
+    dirs = sparse_dirs() if scope else None
+    if dirs is not None:
+        skipped = [path for path in scope if not in_sparse_checkout(path, dirs)]
+        scope = [path for path in scope if path not in skipped]
+        if not scope:
+            raise ValueError("Nothing in scope is checked out.")
+    return tuple(scope), skipped
+
+
+# ` -- 'a' 'b'` to end a shell command line with, '' for the whole repo
+def scope_args(scope):
+    return ' -- ' + ' '.join(shlex.quote(path) for path in scope) if scope else ''
+
+
+# The part of `paths` (from watch events) that lies in `scope`: paths inside
+# it are kept, a directory above it is narrowed to the scope entries below it
+def narrow_to_scope(paths, scope):
+    if not scope:
+        return list(paths)
+    narrowed = []
+    for path in paths:
+        path = path.rstrip('/')
+        for entry in scope:
+            if path == entry or path.startswith(entry + '/'):
+                narrowed.append(path)
+                break
+            if entry.startswith(path + '/'):
+                narrowed.append(entry)
+    return sorted(set(narrowed))
+
+
+
+#&                                                                                          WORKTREE CHANGES
+# `pathspec` limits the query to some paths; `optional_locks=False` keeps git
+# from refreshing the index, for callers that watch the index for changes
+def iter_worktree_changes(pathspec=None, optional_locks=True):
+    args = ['git', '--literal-pathspecs']
+    if not optional_locks:
+        args.append('--no-optional-locks')
+    # the untracked cache and fsmonitor are left to core.untrackedCache and
+    # core.fsmonitor; forcing the cache on writes it into the index
+    args += ['status', '--porcelain=v2', '-z', '--untracked-files=all']
+    if pathspec:
+        args += ['--'] + list(pathspec)
+    return iter_status(stream_command(args))
+
+
+def _new_change(status, old_path):
+    return {
+        'status': status,
+        'additions': 0,
+        'deletions': 0,
+        'old_path': old_path,
+        'binary': False,
+    }
+
+
+# Fill in line counts for a {path: change} dict, asking git about those paths
+# alone: tracked ones are diffed worktree against HEAD (or the empty tree
+# before the first commit), untracked ones are counted directly
+def fill_line_counts(changes):
+    pathspec = []
+    for path, change in changes.items():
+        if change['old_path']:
+            pathspec.append(change['old_path'])
+        pathspec.append(path)
+    if not pathspec:
+        return changes
+
+    base = 'HEAD' if resolve_ref('HEAD') else EMPTY_TREE
+    numstat = stream_command(['git', '--literal-pathspecs', 'diff', base, '-M', '--numstat', '-z', '--'] + pathspec)
+    seen = set()
+    for path, additions, deletions in iter_numstat(numstat):
+        if path in changes:
+            seen.add(path)
+            changes[path]['additions'] += _count(additions)
+            changes[path]['deletions'] += _count(deletions)
+            if additions == '-':
+                changes[path]['binary'] = True
+
+    for path, change in changes.items():
+        if path not in seen and change['status'] == 'A' and os.path.isfile(path):
+            change['additions'] = count_lines(path)
+    return changes
+
+
+def _details(changeset, changes):
+    return {
+        "changed_files": fill_line_counts(changes),
+        "change_counts": changeset.counts(),
+        "changed_total": len(changeset),
+        # where the files that aren't listed are, when there are any
+        "changed_dirs": changeset.rollup() if len(changeset) > len(changes) else [],
+    }
+
+
+# Preview of what committing everything would record, read from the index and
+# worktree without staging anything. Every record goes into a ChangeSet for the
+# counts and directory rollup, but only the first `limit` get a change dict
+# and line counts, so those never cost more than the panel can show.
+def collect_changes(limit, scope=()):
+    changeset = ChangeSet()
+    changes = {}
+
+    for status, path, old_path in iter_worktree_changes(scope or None):
+        changeset.add(status, path, old_path)
+        if len(changes) < limit:
+            changes[path] = _new_change(status, old_path)
+
+    return _details(changeset, changes)
+
+
+# Keeps every changed path in a ChangeSet so a long-running view can re-query
+# only the paths that were touched. `refresh()` with no paths re-reads
+# everything; with paths (files or directories) only those are asked again.
+# `details()` returns the same shape as `collect_changes`.
+class ChangeTracker:
+
+    def __init__(self, limit, scope=()):
+        self.limit = limit
+        self.scope = scope
+        self.changes = ChangeSet()
+        self.error = None
+
+    def refresh(self, paths=None):
+        if paths is not None:
+            paths = narrow_to_scope(paths, self.scope)
+            if not paths:
+                return
+        # everything is read before the set is touched, so a status that fails
+        # or times out leaves the last change list up, marked stale
+        try:
+            if paths is None:
+                changes = ChangeSet()
+                for record in iter_worktree_changes(self.scope or None, optional_locks=False):
+                    changes.add(*record)
+                self.changes = changes
+                self.error = None
+                return
+            records = list(iter_worktree_changes(paths, optional_locks=False))
+        except CommandError as e:
+            self.error = e
+            return
+        self.error = None
+
+        wanted = set(paths)
+        prefixes = tuple(path.rstrip('/') + '/' for path in paths)
+        for status, path, old_path in list(self.changes):
+            if path in wanted or path.startswith(prefixes) or old_path in wanted:
+                self.changes.discard(path)
+        # drop the rows discarded so far once they outnumber the live ones
+        if len(self.changes.codes) > 2 * len(self.changes) + 1024:
+            compacted = ChangeSet()
+            for record in self.changes:
+                compacted.add(*record)
+            self.changes = compacted
+        for status, path, old_path in records:
+            self.changes.add(status, path, old_path)
+
+    def details(self):
+        shown = heapq.nsmallest(self.limit, self.changes, key=lambda record: record[1])
+        changes = {path: _new_change(status, old_path) for status, path, old_path in shown}
+        return {**_details(self.changes, changes), 'stale': str(self.error) if self.error else None}
+
+
+
+#&                                                                                          DIFF PREVIEW
+PREVIEW_LINES = 8
+PREVIEW_HUNKS = 3
+PREVIEW_BYTES = 4096
+# files with more changed lines than this, or bigger than PREVIEW_MAX_SIZE on
+# disk, are never diffed for the preview (generated files, dumps)
+PREVIEW_MAX_CHANGED = 20000
+PREVIEW_MAX_SIZE = 8 << 20
+
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class _Budget:
+    # what one file may show: lines, hunks and bytes, whichever runs out first
+    def __init__(self):
+        self.lines = []
+        self.hunks = 0
+        self.bytes = 0
+        self.truncated = False
+
+    def add(self, line):
+        if self.truncated:
+            return False
+        if line.startswith('@@'):
+            self.hunks += 1
+        self.bytes += len(line)
+        if self.hunks > PREVIEW_HUNKS or self.bytes > PREVIEW_BYTES or len(self.lines) >= PREVIEW_LINES:
+            self.truncated = True
+            return False
+        self.lines.append(line)
+        return True
+
+
+_C_ESCAPES = {'a': 7, 'b': 8, 't': 9, 'n': 10, 'v': 11, 'f': 12, 'r': 13, '"': 34, '\\': 92}
+
+
+# The path in a `---`/`+++` line without its `a/`/`b/` prefix, None for
+# /dev/null. Paths with a space get a trailing TAB; paths with quotes,
+# backslashes or control characters come C-quoted ("a/x\ty").
+def _header_path(value, prefix):
+    value = value.rstrip('\t')
+    if len(value) > 1 and value[0] == value[-1] == '"':
+        raw = value[1:-1].encode('utf-8')
+        out = bytearray()
+        i = 0
+        while i < len(raw):
+            if raw[i] == 92 and i + 1 < len(raw):
+                escape = chr(raw[i + 1])
+                if escape in '01234567':
+                    out.append(int(raw[i + 1:i + 4], 8))
+                    i += 4
+                    continue
+                out.append(_C_ESCAPES.get(escape, raw[i + 1]))
+                i += 2
+                continue
+            out.append(raw[i])
+            i += 1
+        value = out.decode('utf-8', errors='replace')
+    return value[len(prefix):] if value.startswith(prefix) else None
+
+
+# First lines of an untracked file, as a diff would show them
+def _preview_new_file(path, budget):
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(PREVIEW_BYTES)
+    except OSError:
+        return
+    if b'\0' in head:
+        return 'binary'
+    for line in head.decode('utf-8', errors='replace').splitlines():
+        if not budget.add('+' + line):
+            break
+    if len(head) == PREVIEW_BYTES:
+        budget.truncated = True
+
+
+# A few lines of diff for each of `changes` ({path: change}, as collected
+# above), read from one `git diff HEAD` stream over just those paths. Binaries
+# and oversized files are left out of the pathspec up front, every file is cut
+# at PREVIEW_LINES/HUNKS/BYTES, and the stream is closed (the process killed)
+# as soon as every file has used up its budget. `context` is the number of
+# unchanged lines around each change. Returns {path: {lines, truncated, skipped}}.
+def preview_changes(changes, context=0):
+    previews = {}
+    budgets = {}
+    for path, change in changes.items():
+        skipped = None
+        if change['binary']:
+            skipped = 'binary'
+        elif change['status'] != 'D' and _size(path) > PREVIEW_MAX_SIZE:
+            skipped = 'too large'
+        elif change['additions'] + change['deletions'] > PREVIEW_MAX_CHANGED:
+            skipped = 'too large'
+        previews[path] = {'lines': [], 'truncated': False, 'skipped': skipped}
+        if skipped is None:
+            budgets[path] = _Budget()
+
+    if budgets:
+        pathspec = []
+        for path in budgets:
+            if changes[path]['old_path']:
+                pathspec.append(changes[path]['old_path'])
+            pathspec.append(path)
+        base = 'HEAD' if resolve_ref('HEAD') else EMPTY_TREE
+        args = ['git', '--literal-pathspecs', '-c', 'core.quotePath=false', 'diff', base, '-M', '--no-color', '--no-ext-diff', f'-U{context}', '--'] + pathspec
+        lines = stream_command(args, sep=b'\n')
+        open_files = set(budgets)
+        path = None
+        header = False
+        try:
+            for line in lines:
+                if line.startswith('diff --git '):
+                    # the previous file is complete
+                    open_files.discard(path)
+                    if not open_files:
+                        break
+                    path, header = None, True
+                    continue
+                if header:
+                    # `--- a/old` then `+++ b/new` (or /dev/null for a deletion)
+                    if line.startswith('--- '):
+                        path = _header_path(line[4:], 'a/') or path
+                    elif line.startswith('+++ '):
+                        path = _header_path(line[4:], 'b/') or path
+                    if not line.startswith('@@'):
+                        continue
+                    header = False
+                if path not in open_files:
+                    continue
+                if not budgets[path].add(line):
+                    open_files.discard(path)
+                    if not open_files:
+                        break
+        finally:
+            lines.close()
+
+        for path, budget in budgets.items():
+            if not budget.lines and changes[path]['status'] == 'A':
+                previews[path]['skipped'] = _preview_new_file(path, budget)
+            previews[path]['lines'] = budget.lines
+            previews[path]['truncated'] = budget.truncated
+    return previews
+
+
+
+#&                                                                                          COMMIT
+class CommitError(Exception):
+    pass
+
+
+# Stage everything under `pathspec` (the whole worktree by default), right
+# before committing. No time budget: it can run a long while on a big tree.
+# Why a git command failed, from what it printed: its last fatal/error line,
+# else the last line on either stream (`nothing to commit` is on stdout, a
+# hook's complaint on stderr); hints are skipped
+def failure_reason(command, code, output, error):
+    lines = [line.strip() for line in (error + '\n' + output).splitlines()]
+    lines = [line for line in lines if line and not line.startswith('hint:')]
+    errors = [line for line in lines if line.startswith(('fatal:', 'error:'))]
+    return (errors or lines or [f'{command} exited with {code}'])[-1]
+
+
+def stage_changes(pathspec=('.',)):
+    code, output, error = run_git(['git', '--literal-pathspecs', 'add', '-A', '--'] + list(pathspec), timeout=None)
+    if code != 0:
+        # most often another git holding .git/index.lock
+        raise CommitError(failure_reason('git add', code, output, error))
+
+
+COMMIT_LINE = re.compile(r'^\[(?P<branch>.+) (?P<hash>[0-9a-f]{4,})\] (?P<subject>.*)$', re.M)
+STATS_LINE = re.compile(r'(\d+) files? changed(?:, (\d+) insertions?\(\+\))?(?:, (\d+) deletions?\(-\))?')
+
+
+# What `git commit -F` records for a message by default: trailing whitespace
+# and surrounding blank lines dropped, runs of blank lines collapsed
+def clean_message(message):
+    lines = []
+    for line in message.splitlines():
+        line = line.rstrip()
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    while lines and not lines[-1]:
+        lines.pop()
+    return '\n'.join(lines) + '\n'
+
+
+# Commit what's staged with the message piped over stdin (no temp file in the
+# worktree). With a `scope`, only paths in it are committed and anything staged
+# elsewhere stays staged. Everything the summary needs comes back in git's own
+# output: returns {branch, hash, subject, message, files, insertions, deletions}.
+def commit(message, scope=()):
+    # C locale so the summary lines parse the same everywhere
+    env = dict(os.environ, LC_ALL='C')
+    args = ['git', '--literal-pathspecs', 'commit', '--cleanup=whitespace', '-F', '-']
+    if scope:
+        args += ['--'] + list(scope)
+    # hooks run inside this, so it gets no time budget
+    code, output, error = run_git(args, input=message, env=env, timeout=None)
+    if code != 0:
+        raise CommitError(failure_reason('git commit', code, output, error))
+
+    heading = COMMIT_LINE.search(output)
+    if heading is None:
+        raise CommitError('git commit succeeded but its output could not be read')
+    stats = STATS_LINE.search(output)
+    files, insertions, deletions = (int(value or 0) for value in stats.groups()) if stats else (0, 0, 0)
+    branch = heading.group('branch').replace('(root-commit)', '').strip()
+    return {
+        'branch': branch,
+        'hash': heading.group('hash'),
+        'subject': heading.group('subject'),
+        'message': clean_message(message),
+        'files': files,
+        'insertions': insertions,
+        'deletions': deletions,
+    }
@@ -0,0 +1,138 @@
+import json
+import os
+
+from cache import file_state
+
+
+#&                                                                                          GLOBALS
+DEFAULTS = {
+    "heading_type": 1,
+    "history_type": 1,
+    "diff_type": 1,
+    "commit_type": 1,
+    "final_type": 1,
+
+    "history_length": 3,
+    "diff_length": 3,
+    "final_length": 1,
+
+    # paths the changes, commit and history are limited to, space separated
+    "scope": "",
+}
+LIMITS = {
+    'length': (1, 10),
+    'type': (0, 4),
+}
+LOCAL_FILE = '.gitwell'
+GLOBAL_FILE = '.gitwell_globals'
+MAX_CACHED = 32
+
+
+def global_path():
+    return os.path.join(os.path.expanduser('~'), GLOBAL_FILE)
+
+
+def local_path(directory=None):
+    return os.path.abspath(os.path.join(directory or os.getcwd(), LOCAL_FILE))
+
+
+def cache_path():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'gitwell', 'config.json')
+
+
+# `history_length=40` -> 10, `diff_type=x` -> None (ignored); text settings
+# (scope) are kept as they are
+def clamp_value(key, value):
+    if isinstance(DEFAULTS.get(key), str):
+        return None if value is None else str(value)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    for suffix, (low, high) in LIMITS.items():
+        if key.endswith('_' + suffix):
+            return max(low, min(value, high))
+    return value
+
+
+
+#&                                                                                          FILES
+def read_file(path):
+    import yaml
+    try:
+        with open(path, 'r') as f:
+            data = yaml.safe_load(f)
+    except OSError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def merge(*layers):
+    config = dict(DEFAULTS)
+    for layer in layers:
+        for key, value in layer.items():
+            value = clamp_value(key, value)
+            if key in DEFAULTS and value is not None:
+                config[key] = value
+    return config
+
+
+def _read_cache():
+    try:
+        with open(cache_path(), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache(entries):
+    path = cache_path()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(entries, f)
+        os.replace(temp_path, path)
+    except OSError:
+        pass
+
+
+
+#&                                                                                          CONFIG
+# Defaults, then the global file (~/.gitwell_globals), then the local `.gitwell`.
+# The merged result is kept as JSON keyed by both files' (mtime, size), so a
+# normal run reads one small JSON file and never imports yaml.
+def load(directory=None):
+    sources = [global_path(), local_path(directory)]
+    key = [file_state(path) for path in sources]
+    entries = _read_cache()
+    entry = entries.get(sources[1])
+    if entry and entry['key'] == key:
+        # settings added since the entry was written get their defaults
+        return {**DEFAULTS, **entry['config']}
+
+    config = merge(*(read_file(path) for path in sources))
+    entries.pop(sources[1], None)
+    entries[sources[1]] = {'key': key, 'config': config}
+    # oldest entries first, as inserted
+    while len(entries) > MAX_CACHED:
+        del entries[next(iter(entries))]
+    _write_cache(entries)
+    return config
+
+
+# Apply a batch of {key: value} overrides to one file ('local' or 'global') in
+# a single write; values are clamped and unknown keys ignored. Returns what
+# was written.
+def save(overrides, scope='local', directory=None):
+    import yaml
+    path = global_path() if scope == 'global' else local_path(directory)
+    data = read_file(path)
+    for key, value in overrides.items():
+        value = clamp_value(key, value)
+        if key in DEFAULTS and value is not None:
+            data[key] = value
+    with open(path, 'w') as f:
+        yaml.safe_dump(data, f)
+    return data
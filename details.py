@@ -0,0 +1,188 @@
+from backend import CommandError, run_command, run_graph, get_backend, resolve_ref, stream_command
+from changes import collect_changes, scope_args
+from cache import SnapshotCache, state_files, repo_state, useCache
+
+# Repo data behind every view (terminal panels, --json, the benchmarks), with
+# none of the rendering
+
+
+#&                                                                                          DETAILS
+snapshot = None
+
+# On-disk snapshot of repo details, shared between runs
+def get_snapshot():
+    global snapshot
+    if snapshot is None:
+        snapshot = SnapshotCache()
+    return snapshot
+
+
+
+@useCache(max_size=4, state=repo_state(index=False, config=True))
+def get_heading_details():
+    backend = get_backend()
+    cache = get_snapshot()
+
+    # identity, branch and remotes are reused from the last run while HEAD,
+    # the ref and the config files are unchanged
+    def check_snapshot(results):
+        cache_key = cache.key(state_files(cache.git_dir, index=False)) if cache.git_dir else None
+        return cache_key, cache.get('heading', cache_key)
+
+    def unless_cached(lookup):
+        return (lambda results: None if results['snapshot'][1] is not None else lookup(), ('snapshot',))
+
+    results = run_graph({
+        'snapshot': (check_snapshot, ()),
+        'origin': unless_cached(lambda: backend.remote_url('origin')),
+        'push_url': unless_cached(lambda: backend.remote_url('origin', push=True)),
+        'username': unless_cached(lambda: backend.config('user.name')),
+        'email': unless_cached(lambda: backend.config('user.email')),
+        'branch': unless_cached(lambda: backend.branch()),
+        'toplevel': unless_cached(lambda: backend.toplevel()),
+    })
+
+    cache_key, heading = results['snapshot']
+    if heading is not None:
+        return heading
+
+    origin = results['origin']
+    username = results['username']
+    email = results['email']
+    branch = results['branch']
+
+    if origin:
+        fetch_url = origin
+        push_url = results['push_url']
+        fetch_user, fetch_repo = fetch_url.split('/')[-2:]
+        fetch_repo = fetch_repo.replace('.git', '')
+        push_user, push_repo = push_url.split('/')[-2:]
+        push_repo = push_repo.replace('.git', '')
+    else:
+        fetch_url = push_url = 'local'
+        fetch_user = push_user = 'local'
+        fetch_repo = push_repo = results['toplevel'].split('/')[-1]
+
+    heading = {
+        "username": username,
+        "email": email,
+        "branch": branch,
+        "fetch_user": fetch_user,
+        "fetch_url": fetch_url,
+        "fetch_repo": fetch_repo,
+        "push_user": push_user,
+        "push_url": push_url,
+        "push_repo": push_repo,
+    }
+    cache.put('heading', heading, cache_key)
+    cache.save()
+    return heading
+
+
+
+# Remote-tracking refs to compare the branch with: its upstream
+# (branch.<name>.remote/merge) and where it pushes to (branch.<name>.pushRemote
+# or remote.pushDefault), assuming the default fetch refspec
+def tracking_refs(branch):
+    backend = get_backend()
+    upstream = push = None
+    remote = backend.config(f'branch.{branch}.remote')
+    merge = backend.config(f'branch.{branch}.merge')
+    if remote and merge.startswith('refs/heads/'):
+        upstream = merge if remote == '.' else f'refs/remotes/{remote}/{merge[len("refs/heads/"):]}'
+    push_remote = backend.config(f'branch.{branch}.pushRemote') or backend.config('remote.pushDefault')
+    if push_remote:
+        push = f'refs/remotes/{push_remote}/{branch}'
+    return upstream, push
+
+
+# Commits only on `local` and only on `other`. The answer for two commit ids
+# never changes, so it's kept by the pair, in memory and in the snapshot;
+# `rev-list --count` uses the commit-graph when there is one.
+@useCache(max_size=32)
+def count_ahead_behind(local, other):
+    cache = get_snapshot()
+    name = f'ahead_behind:{local}...{other}'
+    cached = cache.get(name, {})
+    if cached is not None:
+        return tuple(cached)
+
+    # a failure raises rather than being cached as (0, 0), i.e. "in sync"
+    counts = run_command(f'git rev-list --left-right --count {local}...{other}', check=True).split()
+    counts = (int(counts[0]), int(counts[1])) if len(counts) == 2 else (0, 0)
+    cache.put(name, list(counts), {})
+    cache.save()
+    return counts
+
+
+# Ahead/behind against the upstream and the push branch, None where there
+# isn't one (or counting it failed). Only refs are read unless one of them moved.
+def get_sync_details(branch):
+    sync = {'upstream': None, 'ahead': None, 'behind': None, 'push_ahead': None, 'push_behind': None}
+    if not branch:
+        return sync
+    local = resolve_ref(f'refs/heads/{branch}')
+    upstream, push = tracking_refs(branch)
+    for ref, prefix in ((upstream, ''), (push, 'push_')):
+        other = resolve_ref(ref) if ref else None
+        if local and other:
+            try:
+                sync[prefix + 'ahead'], sync[prefix + 'behind'] = count_ahead_behind(local, other)
+            except CommandError:
+                pass
+    if upstream:
+        sync['upstream'] = upstream[len('refs/remotes/'):] if upstream.startswith('refs/remotes/') else upstream
+    return sync
+
+
+
+# Heading plus the change list (of `scope`, see changes.py), with line counts
+# for the first `limit` files. Not memoised: worktree edits don't move the
+# repo state, so only the heading and the counts are cached.
+def get_git_details(limit=3, scope=()):
+    # the change list runs alongside the heading lookups
+    results = run_graph({
+        'heading': (lambda results: get_heading_details(), ()),
+        'sync': (lambda results: get_sync_details(results['heading']['branch']), ('heading',)),
+        'changes': (lambda results: collect_changes(limit, scope), ()),
+    })
+    return {**results['heading'], **results['sync'], **results['changes']}
+
+
+
+# Cached on disk per HEAD state; `rev-list --count` can use the commit-graph.
+# With a scope only commits touching it are counted.
+@useCache(max_size=4, state=repo_state(index=False))
+def get_commit_count(scope=()):
+    cache = get_snapshot()
+    cache_key = cache.key(state_files(cache.git_dir, index=False, config=False)) if cache.git_dir else None
+    name = 'commit_count' + (':' + ' '.join(scope) if scope else '')
+    cached = cache.get(name, cache_key)
+    if cached is not None:
+        return cached
+
+    count = run_command('git --literal-pathspecs rev-list --count HEAD' + scope_args(scope))
+    count = int(count) if count.isdigit() else 0
+    cache.put(name, count, cache_key)
+    cache.save()
+    return count
+
+
+
+#&                                                                                          HISTORY
+# The last `limit` commits (touching `scope`), newest first, as plain records
+def get_history(limit, scope=()):
+    fields = ('hash', 'author', 'email', 'time', 'message')
+    # git log fails on a branch with no commits yet
+    if not resolve_ref('HEAD'):
+        return []
+    records = stream_command(['git', '--literal-pathspecs', 'log', '-z', f'-n{limit}', '--format=%H%x1f%an%x1f%ae%x1f%at%x1f%B'] + (['--'] + list(scope) if scope else []))
+    history = []
+    for record in records:
+        if not record:
+            continue
+        commit = dict(zip(fields, record.split('\x1f', 4)))
+        commit['time'] = int(commit['time'])
+        commit['subject'] = commit['message'].split('\n', 1)[0]
+        history.append(commit)
+    return history
@@ -0,0 +1,179 @@
+import os
+import subprocess
+import sys
+import time
+from collections import OrderedDict
+
+import profiling
+from backend import resolve_ref, stream_command
+
+
+#&                                                                                          READER
+# One long-lived `git cat-file --batch`: object ids go in on stdin, raw objects
+# come back on stdout, so any number of commits costs one process
+class CatFile:
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.size = 0
+        self.process = subprocess.Popen(['git', 'cat-file', '--batch'], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    def read(self, oid):
+        self.process.stdin.write(oid.encode() + b'\n')
+        self.process.stdin.flush()
+        header = self.process.stdout.readline().split()
+        if len(header) != 3:
+            return None
+        size = int(header[2])
+        data = self.process.stdout.read(size + 1)[:size]
+        self.size += size
+        return data
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.stdin.close()
+            self.process.wait()
+        self.process.stdout.close()
+        profiling.command(['git', 'cat-file', '--batch'], self.start, self.process.returncode, self.size)
+
+
+# "Name <email> 1700000000 +0100" -> (name, email, timestamp)
+def _parse_person(value):
+    name, _, rest = value.partition(' <')
+    email, _, rest = rest.partition('> ')
+    stamp = rest.split(' ')[0]
+    return name, email, int(stamp) if stamp.isdigit() else 0
+
+
+def parse_commit(oid, data):
+    text = data.decode('utf-8', errors='replace')
+    headers, _, message = text.partition('\n\n')
+    commit = {'hash': oid, 'parents': [], 'message': message}
+    for line in headers.split('\n'):
+        key, _, value = line.partition(' ')
+        if key == 'parent':
+            commit['parents'].append(value)
+        elif key == 'author':
+            commit['author'], commit['email'], commit['time'] = _parse_person(value)
+    commit['subject'] = message.split('\n', 1)[0]
+    return commit
+
+
+# Commits of `rev` newest first, fetched as they are asked for. Hashes come
+# from a `git rev-list` that is read only as far as needed (git waits on the
+# pipe for the rest); commits are decoded through one CatFile and only the
+# last `window` decoded commits are kept.
+class History:
+
+    def __init__(self, rev='HEAD', pathspec=None, window=256):
+        args = ['git', '--literal-pathspecs', 'rev-list', rev]
+        if pathspec:
+            args += ['--'] + list(pathspec)
+        self.oids = []
+        # rev-list fails on a branch with no commits yet
+        self.done = rev == 'HEAD' and not resolve_ref(rev)
+        self.window = window
+        # read from for as long as the browser is open, so no time budget
+        self._revs = None if self.done else stream_command(args, sep=b'\n', timeout=None)
+        self._cat_file = None
+        self._decoded = OrderedDict()
+
+    def _fill(self, count):
+        while not self.done and len(self.oids) < count:
+            oid = next(self._revs, None)
+            if oid is None:
+                self.done = True
+            elif oid:
+                self.oids.append(oid)
+
+    def __getitem__(self, index):
+        self._fill(index + 1)
+        oid = self.oids[index]
+        commit = self._decoded.get(oid)
+        if commit is None:
+            if self._cat_file is None:
+                self._cat_file = CatFile()
+            data = self._cat_file.read(oid)
+            commit = parse_commit(oid, data or b'')
+            self._decoded[oid] = commit
+            while len(self._decoded) > self.window:
+                self._decoded.popitem(last=False)
+        else:
+            self._decoded.move_to_end(oid)
+        return commit
+
+    # Commits [start, start + count), fewer at the end of history
+    def page(self, start, count):
+        self._fill(start + count)
+        return [self[index] for index in range(start, min(start + count, len(self.oids)))]
+
+    def known(self):
+        return len(self.oids)
+
+    def close(self):
+        if self._revs:
+            self._revs.close()
+        if self._cat_file:
+            self._cat_file.close()
+
+
+
+#&                                                                                          TIME
+def relative_time(stamp, now=None):
+    seconds = int((now or time.time()) - stamp)
+    for unit, size in (('year', 31536000), ('month', 2592000), ('week', 604800), ('day', 86400), ('hour', 3600), ('minute', 60)):
+        if seconds >= size:
+            count = seconds // size
+            return f"{count} {unit}{'s' if count > 1 else ''} ago"
+    return f"{max(seconds, 0)} seconds ago"
+
+
+
+#&                                                                                          BROWSER
+KEYS = {
+    b'j': 1, b'\x1b[B': 1,
+    b'k': -1, b'\x1b[A': -1,
+    b' ': 'page', b'n': 'page', b'\x1b[6~': 'page',
+    b'b': '-page', b'p': '-page', b'\x1b[5~': '-page',
+    b'g': 'top',
+}
+
+
+# Scroll through `history` a screen at a time. `render(commits, start, history)`
+# draws the visible commits; only the ones on screen are ever read from git.
+def browse(history, render, footer=''):
+    from screen import Screen, cbreak, terminal_size
+
+    screen = Screen()
+    top = 0
+    try:
+        with cbreak():
+            while True:
+                rows = max(1, terminal_size()[1] - 4)
+                commits = history.page(top, rows)
+                screen.show([('history', render(commits, top, history))], footer)
+
+                key = os.read(sys.stdin.fileno(), 8)
+                action = KEYS.get(key)
+                if key in (b'q', b'\x1b', b'\x04'):
+                    break
+                if action == 'page':
+                    step = rows
+                elif action == '-page':
+                    step = -rows
+                elif action == 'top':
+                    step = -top
+                elif isinstance(action, int):
+                    step = action
+                else:
+                    continue
+                # don't scroll past the last page
+                target = max(0, top + step)
+                history.page(target, rows)
+                last = max(0, history.known() - rows) if history.done else target
+                top = min(target, last)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        history.close()
+        sys.stdout.write('\n')
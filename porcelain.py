@@ -0,0 +1,96 @@
+import json
+import os
+import sys
+
+import config
+from backend import CommandError, find_git_dir, run_graph
+from changes import enter_toplevel, resolve_scope
+from details import get_commit_count, get_git_details, get_history
+
+
+# `asdf --json` / `asdf --porcelain`: repo state for scripts, CI hooks and editor
+# plugins. Nothing here imports colorama, rich or InquirerPy, and nothing
+# prompts. --json prints one document; --porcelain prints NDJSON, one record
+# per line with a "type" of heading, summary, change or commit.
+
+
+def parse_cli(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog='asdf', description='Repo state as JSON.')
+    parser.add_argument('paths', nargs='*', help='only changes and history under these paths')
+    parser.add_argument('--json', action='store_true', help='one JSON document')
+    parser.add_argument('--porcelain', action='store_true', help='NDJSON, one record per line')
+    parser.add_argument('--changes', type=int, metavar='N', help='changed files with line counts (default: diff_length)')
+    parser.add_argument('--history', type=int, metavar='N', help='commits of history (default: history_length)')
+    args, _ = parser.parse_known_args(argv)
+    return args
+
+
+def collect(changes_limit, history_limit, scope=()):
+    results = run_graph({
+        'details': (lambda results: get_git_details(changes_limit, scope), ()),
+        'history': (lambda results: get_history(history_limit, scope) if history_limit else [], ()),
+        'count': (lambda results: get_commit_count(scope), ()),
+    })
+    details = dict(results['details'])
+    files = [{'path': path, **change} for path, change in details.pop('changed_files').items()]
+    return {
+        'heading': {key: value for key, value in details.items() if not key.startswith('change')},
+        'changes': {
+            'counts': details['change_counts'],
+            'total': details['changed_total'],
+            'files': files,
+            'dirs': details.get('changed_dirs', []),
+            'scope': list(scope),
+        },
+        'history': results['history'],
+        'commit_count': results['count'],
+    }
+
+
+def write_ndjson(state, out):
+    def line(record_type, record):
+        out.write(json.dumps({'type': record_type, **record}) + '\n')
+
+    line('heading', state['heading'])
+    line('summary', {
+        'counts': state['changes']['counts'],
+        'total': state['changes']['total'],
+        'commit_count': state['commit_count'],
+    })
+    for change in state['changes']['files']:
+        line('change', change)
+    for commit in state['history']:
+        line('commit', commit)
+
+
+def main(argv=None):
+    args = parse_cli(argv)
+    if find_git_dir() is None:
+        print(json.dumps({'error': 'not a git repository'}))
+        return 1
+
+    # work from the top of the repo like the terminal view: paths are relative
+    # to where asdf was run, and a run from a subdirectory is scoped to it
+    origin = os.getcwd()
+    start = enter_toplevel()
+    settings = config.load()
+    try:
+        scope, _ = resolve_scope(args.paths, origin, start, settings['scope'])
+    except ValueError as e:
+        print(json.dumps({'error': str(e)}))
+        return 1
+    changes_limit = args.changes if args.changes is not None else settings['diff_length']
+    history_limit = args.history if args.history is not None else settings['history_length']
+    try:
+        state = collect(changes_limit, history_limit, scope)
+    except CommandError as e:
+        print(json.dumps({'error': str(e)}))
+        return 1
+
+    if args.porcelain:
+        write_ndjson(state, sys.stdout)
+    else:
+        json.dump(state, sys.stdout, indent=1)
+        sys.stdout.write('\n')
+    return 0
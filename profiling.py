@@ -0,0 +1,148 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Off unless `--profile` or $GITWELL_PROFILE turns it on; every hook below is a
+# single flag check when it's off. GITWELL_PROFILE=1 prints the summary,
+# GITWELL_PROFILE=trace.json also writes a Chrome trace (chrome://tracing,
+# ui.perfetto.dev).
+enabled = False
+trace_path = None
+origin = time.perf_counter()
+
+ANSI = re.compile(r'\x1b\[[0-9;]*m')
+
+_events = []
+_lock = threading.Lock()
+_threads = {}
+
+
+def enable(path=None):
+    global enabled, trace_path
+    enabled = True
+    if path and path not in (True, '1'):
+        trace_path = path
+
+
+def enable_from_env():
+    value = os.environ.get('GITWELL_PROFILE')
+    if value:
+        enable(value)
+
+
+def _thread_id():
+    ident = threading.get_ident()
+    with _lock:
+        return _threads.setdefault(ident, len(_threads))
+
+
+def record(name, category, start, end, **details):
+    if not enabled:
+        return
+    event = {
+        'name': name,
+        'category': category,
+        'start': start,
+        'end': end,
+        'thread': _thread_id(),
+        'details': details,
+    }
+    with _lock:
+        _events.append(event)
+
+
+# Wall time of one phase of a run: `with phase('heading'): ...`
+@contextmanager
+def phase(name):
+    if not enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, 'phase', start, time.perf_counter())
+
+
+def command(args, start, exit_code, output_bytes, error=b''):
+    if not enabled:
+        return
+    # colour codes baked into --pretty formats would garble the table
+    text = ANSI.sub('', args if isinstance(args, str) else ' '.join(args))
+    details = {'exit': exit_code, 'bytes': output_bytes}
+    if error:
+        details['stderr'] = error.decode('utf-8', errors='replace').strip()[:200]
+    record(text, 'command', start, time.perf_counter(), **details)
+
+
+
+#&                                                                                          REPORT
+def _ms(seconds):
+    return seconds * 1000
+
+
+def _clip(text, width):
+    return text if len(text) <= width else text[:width - 3] + '...'
+
+
+def summary():
+    from cache import cache_stats
+    lines = []
+    phases = [e for e in _events if e['category'] == 'phase']
+    commands = [e for e in _events if e['category'] == 'command']
+
+    lines.append(f"{'phase':<16}{'start ms':>10}{'wall ms':>10}")
+    for event in phases:
+        lines.append(f"{event['name']:<16}{_ms(event['start'] - origin):>10.1f}{_ms(event['end'] - event['start']):>10.1f}")
+
+    total = sum(e['end'] - e['start'] for e in commands)
+    lines.append('')
+    lines.append(f"{len(commands)} commands, {_ms(total):.1f} ms in total")
+    lines.append(f"{'ms':>8}{'exit':>6}{'bytes':>9}  command")
+    for event in commands:
+        details = event['details']
+        # no exit code: killed (timed out or cancelled)
+        exit_code = 'kill' if details['exit'] is None else details['exit']
+        lines.append(f"{_ms(event['end'] - event['start']):>8.1f}{exit_code:>6}{details['bytes']:>9}  {_clip(event['name'], 70)}")
+        if details.get('stderr'):
+            lines.append(f"{'':>25}{_clip(details['stderr'].splitlines()[0], 70)}")
+
+    lines.append('')
+    lines.append(f"{'cache':<28}{'hits':>6}{'misses':>8}{'evict':>7}{'inval':>7}")
+    for name, info in cache_stats().items():
+        lines.append(f"{name:<28}{info['hits']:>6}{info['misses']:>8}{info['evictions']:>7}{info['invalidations']:>7}")
+    return '\n'.join(lines)
+
+
+def chrome_trace():
+    from cache import cache_stats
+    pid = os.getpid()
+    trace = []
+    for event in _events:
+        trace.append({
+            'name': event['name'],
+            'cat': event['category'],
+            'ph': 'X',
+            'ts': round(_ms(event['start'] - origin) * 1000, 1),
+            'dur': round(_ms(event['end'] - event['start']) * 1000, 1),
+            'pid': pid,
+            'tid': event['thread'],
+            'args': event['details'],
+        })
+    return {'traceEvents': trace, 'otherData': {'argv': sys.argv, 'caches': cache_stats()}}
+
+
+# Print the summary on stderr and write the trace, if one was asked for
+def report():
+    if not enabled:
+        return
+    print(summary(), file=sys.stderr)
+    if trace_path:
+        with open(trace_path, 'w') as f:
+            json.dump(chrome_trace(), f)
+        print(f"trace written to {trace_path}", file=sys.stderr)
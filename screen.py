@@ -0,0 +1,130 @@
+import os
+import re
+import sys
+
+
+CLEAR = '\033[H\033[2J'
+ANSI = re.compile(r'\x1b\[[0-9;?]*[A-Za-z]')
+
+
+def terminal_size():
+    try:
+        width, height = os.get_terminal_size()
+    except OSError:
+        width, height = 0, 0
+    return width or 80, height or 24
+
+
+# Where the cursor ends up after writing `text` from (row, col)
+def advance(row, col, text, width):
+    segments = text.split('\n')
+    for i, segment in enumerate(segments):
+        col += len(ANSI.sub('', segment).expandtabs(8))
+        if col > width:
+            row += (col - 1) // width
+            col = (col - 1) % width + 1
+        if i < len(segments) - 1:
+            row += 1
+            col = 0
+    return row, col
+
+
+# `text` cut short (with '...') or padded to `width` columns on screen; escape
+# codes are kept and don't count
+def fit(text, width):
+    length = len(ANSI.sub('', text))
+    if length <= width:
+        return text + ' ' * (width - length)
+    out = []
+    room = max(0, width - 3)
+    for part in re.split(r'(\x1b\[[0-9;?]*[A-Za-z])', text):
+        if ANSI.fullmatch(part):
+            out.append(part)
+        else:
+            out.append(part[:room])
+            room -= len(out[-1])
+    return ''.join(out) + '...'
+
+
+# The terminal drawn as a stack of named panels from the top-left corner. Each
+# frame is built in memory and written with a single write; panels at the top
+# that are unchanged since the last frame stay on screen and only the rest is
+# redrawn. `shown` is None while the top of the screen is unknown (something
+# else printed, or the frame scrolled off), which forces a full redraw.
+class Screen:
+
+    def __init__(self, out=None):
+        self.out = out or sys.stdout
+        self.shown = None
+        self.rows = 0
+
+    def write(self, text):
+        self.out.write(text)
+        self.out.flush()
+
+    def clear(self):
+        self.write(CLEAR)
+        self.shown = []
+        self.rows = 0
+
+    def lost(self):
+        self.shown = None
+
+    # Account for `lines` printed below the frame by someone else (a prompt);
+    # if that could have scrolled the screen, the frame's position is lost
+    def printed(self, lines):
+        if self.rows + lines >= terminal_size()[1]:
+            self.lost()
+        self.rows += lines
+
+    # `panels` is a list of (name, text). With `clear=False` and an unknown
+    # top, the frame is drawn at the cursor instead of over a cleared screen.
+    def show(self, panels, footer='', clear=True):
+        width, height = terminal_size()
+        keep = 0
+        row, col = 0, 0
+        if self.shown is not None:
+            for panel, old in zip(panels, self.shown):
+                if panel != old:
+                    break
+                row, col = advance(row, col, panel[1], width)
+                keep += 1
+
+        if self.shown is None and not clear:
+            out = []
+        elif self.shown is None or row >= height:
+            out = [CLEAR]
+            keep, row, col = 0, 0, 0
+        else:
+            out = [f'\033[{row + 1};{col + 1}H\033[J']
+
+        for _, text in panels[keep:]:
+            out.append(text)
+            row, col = advance(row, col, text, width)
+        out.append(footer)
+        row, col = advance(row, col, footer, width)
+        self.write(''.join(out))
+
+        if self.shown is not None or clear:
+            self.shown = list(panels)
+            self.rows = row
+            if row >= height:
+                self.lost()
+
+
+class cbreak:
+    # Single keypresses without echo, restored on exit
+    def __enter__(self):
+        import termios
+        import tty
+        self.fd = sys.stdin.fileno()
+        self.saved = termios.tcgetattr(self.fd)
+        tty.setcbreak(self.fd)
+        sys.stdout.write('\033[?25l')
+        return self
+
+    def __exit__(self, *exc):
+        import termios
+        termios.tcsetattr(self.fd, termios.TCSADRAIN, self.saved)
+        sys.stdout.write('\033[?25h')
+        sys.stdout.flush()
@@ -0,0 +1,180 @@
+import json
+import os
+import sys
+import time
+
+
+TEMPLATE_URL = 'https://raw.githubusercontent.com/github/gitignore/main/{name}.gitignore'
+LISTING_URL = 'https://api.github.com/repos/github/gitignore/contents'
+TIMEOUT = 5
+
+# Used until a listing has been fetched once
+DEFAULT_NAMES = ['AL', 'Actionscript', 'Ada', 'Agda', 'Android', 'AppEngine', 'AppceleratorTitanium', 'ArchLinuxPackages', 'Autotools', 'C', 'C++', 'CFWheels', 'CMake', 'CUDA', 'CakePHP', 'ChefCookbook', 'Clojure', 'CodeIgniter', 'CommonLisp', 'Composer', 'Concrete5', 'Coq', 'CraftCMS', 'D', 'DM', 'Dart', 'Delphi', 'Drupal', 'EPiServer', 'Eagle', 'Elisp', 'Elixir', 'Elm', 'Erlang', 'ExpressionEngine', 'ExtJs', 'Fancy', 'Finale', 'FlaxEngine', 'ForceDotCom', 'Fortran', 'FuelPHP', 'GWT', 'Gcov', 'GitBook', 'Go', 'Godot', 'Gradle', 'Grails', 'Haskell', 'IGORPro', 'Idris', 'JBoss', 'JENKINS_HOME', 'Java', 'Jekyll', 'Joomla', 'Julia', 'KiCad', 'Kohana', 'Kotlin', 'LabVIEW', 'Laravel', 'Leiningen', 'LemonStand', 'Lilypond', 'Lithium', 'Lua', 'Magento', 'Maven', 'Mercury', 'MetaProgrammingSystem', 'Nanoc', 'Nim', 'Node', 'OCaml', 'Objective-C', 'Opa', 'OpenCart', 'OracleForms', 'Packer', 'Perl', 'Phalcon', 'PlayFramework', 'Plone', 'Prestashop', 'Processing', 'PureScript', 'Python', 'Qooxdoo', 'Qt', 'R', 'ROS', 'Racket', 'Rails', 'Raku', 'RhodesRhomobile', 'Ruby', 'Rust', 'SCons', 'Sass', 'Scala', 'Scheme', 'Scrivener', 'Sdcc', 'SeamGen', 'SketchUp', 'Smalltalk', 'Stella', 'SugarCRM', 'Swift', 'Symfony', 'SymphonyCMS', 'TeX', 'Terraform', 'Textpattern', 'TurboGears2', 'TwinCAT3', 'Typo3', 'Unity', 'UnrealEngine', 'VVVV', 'VisualStudio', 'Waf', 'WordPress', 'Xojo', 'Yeoman', 'Yii', 'ZendFramework', 'Zephir']
+
+
+class TemplateError(Exception):
+    pass
+
+
+#&                                                                                          LOCATIONS
+def cache_dir():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'gitwell', 'gitignore')
+
+
+# Templates shipped next to the script (or inside a PyInstaller bundle)
+def bundled_dir():
+    base = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(base, 'gitignore_templates')
+
+
+def is_offline():
+    return bool(os.environ.get('GITWELL_OFFLINE'))
+
+
+
+#&                                                                                          STORE
+# Local copies of github/gitignore templates. `index.json` records the known
+# template names and, per cached template, the validators needed to refresh it
+# conditionally. Lookups never touch the network if a local copy exists.
+class TemplateStore:
+
+    def __init__(self, path=None):
+        self.path = path or cache_dir()
+        self.index_path = os.path.join(self.path, 'index.json')
+        self._index = None
+        self._session = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            try:
+                with open(self.index_path, 'r') as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+            self._index.setdefault('names', [])
+            self._index.setdefault('templates', {})
+            self._index.setdefault('listing', {})
+        return self._index
+
+    def save_index(self):
+        os.makedirs(self.path, exist_ok=True)
+        temp_path = f'{self.index_path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(self.index, f, indent=1)
+        os.replace(temp_path, self.index_path)
+
+    def _file(self, name):
+        return os.path.join(self.path, f'{name}.gitignore')
+
+    def _bundled_file(self, name):
+        return os.path.join(bundled_dir(), f'{name}.gitignore')
+
+    def names(self):
+        names = set(self.index['names'] or DEFAULT_NAMES)
+        names.update(self.index['templates'])
+        if os.path.isdir(bundled_dir()):
+            names.update(entry[:-len('.gitignore')] for entry in os.listdir(bundled_dir()) if entry.endswith('.gitignore'))
+        return sorted(names, key=str.lower)
+
+    def is_cached(self, name):
+        return os.path.isfile(self._file(name)) or os.path.isfile(self._bundled_file(name))
+
+    def get(self, name):
+        for path in (self._file(name), self._bundled_file(name)):
+            if os.path.isfile(path):
+                with open(path, 'r') as f:
+                    return f.read()
+        if is_offline():
+            raise TemplateError(f"Template '{name}' is not cached and GITWELL_OFFLINE is set.")
+        self.fetch(name)
+        with open(self._file(name), 'r') as f:
+            return f.read()
+
+    # Several templates in one file, each under its own header
+    def compose(self, names):
+        if len(names) == 1:
+            return self.get(names[0])
+        parts = []
+        for name in names:
+            parts.append(f'### {name} ###\n{self.get(name).rstrip()}\n')
+        return '\n'.join(parts)
+
+
+    #&                                                                                      NETWORK
+    @property
+    def session(self):
+        # one pooled session, so a refresh reuses a single connection
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+            self._session.headers['User-Agent'] = 'gitwell'
+        return self._session
+
+    def _conditional_get(self, url, validators):
+        import requests
+        headers = {}
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        try:
+            response = self.session.get(url, headers=headers, timeout=TIMEOUT)
+        except requests.RequestException as e:
+            raise TemplateError(f'Could not reach {url}: {e.__class__.__name__}') from e
+        if response.status_code not in (200, 304):
+            raise TemplateError(f'{url} returned {response.status_code}')
+        return response
+
+    def _validators(self, response):
+        return {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fetched': time.time(),
+        }
+
+    # Returns True if the local copy changed
+    def fetch(self, name):
+        entry = self.index['templates'].get(name, {}) if os.path.isfile(self._file(name)) else {}
+        response = self._conditional_get(TEMPLATE_URL.format(name=name), entry)
+        if response.status_code == 304:
+            entry['fetched'] = time.time()
+            self.save_index()
+            return False
+
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file(name), 'w') as f:
+            f.write(response.text)
+        self.index['templates'][name] = self._validators(response)
+        self.save_index()
+        return True
+
+    def fetch_listing(self):
+        response = self._conditional_get(LISTING_URL, self.index['listing'])
+        if response.status_code == 200:
+            self.index['names'] = [
+                entry['name'][:-len('.gitignore')]
+                for entry in response.json()
+                if entry.get('type') == 'file' and entry['name'].endswith('.gitignore')
+            ]
+            self.index['listing'] = self._validators(response)
+            self.save_index()
+        return self.index['names']
+
+    # Refresh the listing and every cached template; returns (updated, failed)
+    def refresh(self, names=None):
+        updated, failed = [], []
+        if is_offline():
+            return updated, [('all', 'GITWELL_OFFLINE is set')]
+        try:
+            self.fetch_listing()
+        except TemplateError as e:
+            failed.append(('index', str(e)))
+        for name in names or list(self.index['templates']):
+            try:
+                if self.fetch(name):
+                    updated.append(name)
+            except TemplateError as e:
+                failed.append((name, str(e)))
+        return updated, failed
@@ -0,0 +1,101 @@
+import subprocess
+
+import pytest
+
+from backend import FileBackend, parse_config_file
+
+
+@pytest.fixture
+def git_env(tmp_path, monkeypatch):
+    # only the files a test writes are read, by git and by the parser alike
+    monkeypatch.setenv('GIT_CONFIG_NOSYSTEM', '1')
+    monkeypatch.setenv('GIT_CONFIG_GLOBAL', str(tmp_path / 'global'))
+    monkeypatch.delenv('GIT_CONFIG_COUNT', raising=False)
+    monkeypatch.delenv('GIT_DIR', raising=False)
+    (tmp_path / 'global').write_text('')
+    return tmp_path
+
+
+def git(*args, cwd=None):
+    return subprocess.run(['git'] + list(args), cwd=cwd, capture_output=True, text=True, check=True).stdout
+
+
+def git_list(path):
+    # `key\nvalue\0`, or just `key\0` for a bare boolean
+    entries = []
+    for record in git('config', '-f', str(path), '--list', '-z').split('\0')[:-1]:
+        key, sep, value = record.partition('\n')
+        entries.append((key, value if sep else 'true'))
+    return entries
+
+
+def test_parse_config_file_matches_git(git_env):
+    path = git_env / 'config'
+    path.write_text('\n'.join([
+        '[core]',
+        '\teditor = vim   # trailing comment',
+        '\tbare',
+        '[user]',
+        '\tname = "Jane ; Doe" ; comment',
+        '\temail = a\\"b\\\\c@x',
+        '[alias]',
+        '\tlg = log \\',
+        '\t  --oneline   \\',
+        '--graph',
+        '\ttab = "a\\tb"',
+        '\tinner = one   two',
+        '\tpadded = "  kept  " x',
+        '[Remote "Up.Stream"]',
+        '\tURL = git@host:repo.git',
+        '[branch.Feature]',
+        '\tremote = up',
+        '[x]y = 1',
+    ]) + '\n')
+    assert parse_config_file(str(path)) == git_list(path)
+
+
+def test_includes_match_git(git_env):
+    repo = git_env / 'work' / 'repo'
+    repo.mkdir(parents=True)
+    git('init', '-q', '-b', 'main', cwd=repo)
+    (git_env / 'base.inc').write_text('[user]\n\tname = Base\n\temail = base@example.com\n')
+    (git_env / 'work.inc').write_text('[user]\n\temail = work@example.com\n')
+    (git_env / 'main.inc').write_text('[core]\n\tabbrev = 12\n')
+    (git_env / 'global').write_text('\n'.join([
+        '[include]',
+        '\tpath = base.inc',
+        '[includeIf "gitdir:work/"]',
+        '\tpath = work.inc',
+        '[includeIf "gitdir:elsewhere/"]',
+        '\tpath = main.inc',
+        '[includeIf "onbranch:main"]',
+        '\tpath = main.inc',
+    ]) + '\n')
+
+    backend = FileBackend(str(repo))
+    for key in ('user.name', 'user.email', 'core.abbrev'):
+        assert backend.config(key) == git('config', key, cwd=repo).strip()
+    assert (backend.config('user.email'), backend.config('core.abbrev')) == ('work@example.com', '12')
+
+
+def test_remote_url_rewrites_match_git(git_env):
+    repo = git_env / 'repo'
+    repo.mkdir()
+    git('init', '-q', cwd=repo)
+    for args in (
+        ('remote.origin.url', 'https://host/team/repo.git'),
+        ('remote.fork.url', 'gh:me/repo.git'),
+        ('remote.fork.pushurl', 'gh:me/push.git'),
+        ('url.ssh://git@host/.pushInsteadOf', 'https://host/'),
+        ('url.https://mirror/.insteadOf', 'https://host/'),
+        # the longest matching prefix wins
+        ('url.https://mirror/team-only/.insteadOf', 'https://host/team/'),
+        ('url.git@github.com:.insteadOf', 'gh:'),
+    ):
+        git('config', *args, cwd=repo)
+
+    backend = FileBackend(str(repo))
+    assert backend.remote_url('origin', push=True) == 'ssh://git@host/team/repo.git'
+    for remote in ('origin', 'fork'):
+        assert backend.remote_url(remote) == git('remote', 'get-url', remote, cwd=repo).strip()
+        assert backend.remote_url(remote, push=True) == git('remote', 'get-url', '--push', remote, cwd=repo).strip()
@@ -0,0 +1,81 @@
+from changes import ChangeSet, iter_status
+
+
+def test_status_copy_counts_as_added():
+    # `status.renames=copies`: a staged copy of a.txt to b.txt
+    tokens = [
+        '1 .M N... 100644 100644 100644 e69de29 e69de29 a.txt',
+        '2 C. N... 100644 100644 100644 e69de29 e69de29 C100 b.txt', 'a.txt',
+    ]
+    records = list(iter_status(tokens))
+    assert records == [('M', 'a.txt', None), ('A', 'b.txt', None)]
+
+    changes = ChangeSet()
+    for record in records:
+        changes.add(*record)
+    assert changes.counts() == {'M': 1, 'A': 1, 'D': 0, 'R': 0}
+
+
+def test_status_rename_keeps_score():
+    tokens = ['2 R. N... 100644 100644 100644 e69de29 e69de29 R100 new.txt', 'old.txt']
+    assert list(iter_status(tokens)) == [('R100', 'new.txt', 'old.txt')]
+
+
+def test_diff_header_paths():
+    from changes import _header_path
+    assert _header_path('a/with space.txt\t', 'a/') == 'with space.txt'
+    assert _header_path('"b/q\\"uote\\ttab.txt"', 'b/') == 'q"uote\ttab.txt'
+    assert _header_path('/dev/null', 'a/') is None
+
+
+def test_failure_reason():
+    from changes import failure_reason
+    # `nothing to commit` only goes to stdout
+    assert failure_reason('git commit', 1, 'On branch main\nnothing to commit, working tree clean\n', '') == 'nothing to commit, working tree clean'
+    # the fatal line wins over the explanation after it
+    error = "fatal: Unable to create '.git/index.lock': File exists.\n\nAnother git process seems to be running\n"
+    assert failure_reason('git add', 128, '', error) == "fatal: Unable to create '.git/index.lock': File exists."
+    assert failure_reason('git commit', 1, '', 'lint failed: a.py\nhint: run the linter\n') == 'lint failed: a.py'
+    assert failure_reason('git commit', 1, '', '') == 'git commit exited with 1'
+
+
+def rollup_rows(changes, max_rows):
+    return [(entry['path'], entry['kind'], entry['total']) for entry in changes.rollup(max_rows)]
+
+
+def test_rollup_splits_while_it_fits():
+    changes = ChangeSet()
+    for status, path in (('M', 'src/a/x.py'), ('A', 'src/b/y.py'), ('D', 'docs/r.md'), ('M', 'top.txt')):
+        changes.add(status, path)
+    # src is split too; the files directly in ./ get their own row
+    assert rollup_rows(changes, 5) == [('docs/', 'tree', 1), ('./', 'files', 1), ('src/a/', 'tree', 1), ('src/b/', 'tree', 1)]
+    assert rollup_rows(changes, 3) == [('src/', 'tree', 2), ('docs/', 'tree', 1), ('./', 'files', 1)]
+    assert changes.rollup(5)[0]['counts'] == {'M': 0, 'A': 0, 'D': 1, 'R': 0}
+
+
+def test_rollup_lumps_the_rest():
+    changes = ChangeSet()
+    for index, size in enumerate((5, 4, 3, 2, 1, 1)):
+        for file in range(size):
+            changes.add('M', f'd{index}/f{file}')
+    assert rollup_rows(changes, 3) == [('./', 'rest', 7), ('d0/', 'tree', 5), ('d1/', 'tree', 4)]
+
+
+def test_discard():
+    changes = ChangeSet()
+    changes.add('M', 'lib/a.py')
+    changes.add('R100', 'lib/new.py', 'lib/old.py')
+    changes.add('A', 'b.txt')
+
+    changes.discard('lib/new.py')
+    changes.discard('missing.txt')
+    assert len(changes) == 2
+    assert list(changes) == [('M', 'lib/a.py', None), ('A', 'b.txt', None)]
+    assert changes.counts() == {'M': 1, 'A': 1, 'D': 0, 'R': 0}
+    assert rollup_rows(changes, 5) == [('lib/', 'tree', 1), ('./', 'files', 1)]
+
+    # a discarded path can come back
+    changes.add('D', 'lib/new.py')
+    changes.discard('lib/a.py')
+    assert list(changes) == [('A', 'b.txt', None), ('D', 'lib/new.py', None)]
+    assert changes.counts(changes.dir_index['lib']) == {'M': 0, 'A': 0, 'D': 1, 'R': 0}
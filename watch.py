@@ -0,0 +1,254 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import signal
+import struct
+import sys
+
+from backend import find_git_dir, stream_command
+from screen import Screen, cbreak
+
+
+#&                                                                                          INOTIFY
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct('iIII')
+
+POLL_INTERVAL = 2.0
+DEBOUNCE = 0.05
+MAX_DEBOUNCE = 0.3
+
+
+# Minimal inotify binding over ctypes (Linux only, no dependencies). Each
+# event is reported as (directory, name, mask) with absolute paths.
+class Inotify:
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.dirs = {}
+        self.exhausted = False
+
+    def add(self, path):
+        wd = self._add_watch(self.fd, os.fsencode(path), WATCH_MASK | IN_ONLYDIR)
+        if wd < 0:
+            # ENOSPC: out of watches (fs.inotify.max_user_watches)
+            if ctypes.get_errno() == 28:
+                self.exhausted = True
+            return False
+        self.dirs[wd] = path
+        return True
+
+    def add_tree(self, root, skip=()):
+        for dirpath, dirnames, _ in os.walk(root):
+            if not self.add(dirpath):
+                dirnames[:] = []
+                continue
+            dirnames[:] = [name for name in dirnames if os.path.join(dirpath, name) not in skip]
+
+    def read(self):
+        events = []
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return events
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0').decode('utf-8', errors='replace')
+            offset += length
+            if mask & IN_IGNORED:
+                self.dirs.pop(wd, None)
+                continue
+            events.append((self.dirs.get(wd), name, mask))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+
+#&                                                                                          EVENTS
+# Directories git ignores aren't watched at all (node_modules, build output...)
+def ignored_dirs(root):
+    records = stream_command(['git', 'ls-files', '-z', '--others', '--ignored', '--exclude-standard', '--directory'])
+    return {os.path.join(root, path.rstrip('/')) for path in records if path.endswith('/')}
+
+
+def is_ignored(path):
+    # exits 1 when the path isn't ignored
+    records = stream_command(['git', 'check-ignore', '-z', '--', path], check=False)
+    return any(records)
+
+
+# `path` is `directory` or inside it (`.git` doesn't take in `.gitignore`)
+def within(path, directory):
+    return path == directory or path.startswith(directory + os.sep)
+
+
+# Sorts a batch of events into the panels they affect. Returns
+# (panels, paths, full): worktree paths that need their status re-read, and
+# whether the whole change list has to be re-read (index, HEAD or overflow).
+class EventSorter:
+
+    def __init__(self, root, git_dir):
+        self.root = root
+        self.git_dir = git_dir
+        self.refs_dir = os.path.join(git_dir, 'refs')
+        self.own_dir = os.path.join(git_dir, 'gitwell')
+
+    def sort(self, events, notifier):
+        panels = set()
+        paths = set()
+        full = False
+        for directory, name, mask in events:
+            if mask & IN_Q_OVERFLOW or directory is None:
+                return {'heading', 'history', 'changes'}, set(), True
+            path = os.path.join(directory, name) if name else directory
+            if name.endswith('.lock') or within(path, self.own_dir):
+                continue
+
+            if within(path, self.git_dir):
+                if directory == self.git_dir and name in ('HEAD', 'config'):
+                    panels.update(('heading', 'history', 'changes'))
+                    full = True
+                elif directory == self.git_dir and name == 'index':
+                    panels.add('changes')
+                    full = True
+                elif name == 'packed-refs' or within(path, self.refs_dir):
+                    panels.update(('heading', 'history'))
+                    if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                        notifier.add_tree(path)
+                continue
+
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and not is_ignored(path):
+                notifier.add_tree(path)
+            panels.add('changes')
+            paths.add(os.path.relpath(path, self.root))
+        return panels, paths, full
+
+
+
+#&                                                                                          DASHBOARD
+# Panels re-rendered by name; the screen keeps the unchanged ones above the
+# first changed panel on screen and redraws from there
+class Dashboard:
+
+    def __init__(self, panels, footer=''):
+        self.panels = panels
+        self.footer = footer
+        self.text = {}
+        self.screen = Screen()
+
+    def update(self, names=None):
+        for name, render in self.panels:
+            if names is None or name in names:
+                self.text[name] = render()
+        self.screen.show([(name, self.text.get(name, '')) for name, _ in self.panels], self.footer)
+
+    def draw(self):
+        self.screen.lost()
+        self.update(())
+
+
+
+#&                                                                                          LOOP
+# Keep one process alive and redraw panels as the repo changes. `panels` is a
+# list of (name, render) for 'heading', 'history' and 'changes'; `tracker` is
+# the ChangeTracker behind the changes panel; `commit` runs the commit prompt.
+# With inotify the loop blocks in select() until something happens; without
+# it (or once the watch limit is hit) it falls back to polling.
+def run(panels, tracker, commit, footer=''):
+    root = os.getcwd()
+    git_dir = find_git_dir(root)
+    dashboard = Dashboard(panels, footer)
+
+    try:
+        notifier = Inotify()
+        notifier.add_tree(git_dir, skip={os.path.join(git_dir, 'objects'), os.path.join(git_dir, 'gitwell'), os.path.join(git_dir, 'logs')})
+        notifier.add_tree(root, skip={git_dir} | ignored_dirs(root))
+        if notifier.exhausted:
+            notifier.close()
+            notifier = None
+    except (OSError, AttributeError):
+        notifier = None
+    sorter = EventSorter(root, git_dir)
+
+    wake_read, wake_write = os.pipe()
+    os.set_blocking(wake_write, False)
+    previous = signal.signal(signal.SIGWINCH, lambda *args: os.write(wake_write, b'.'))
+
+    def refresh_all():
+        tracker.refresh()
+        dashboard.screen.lost()
+        dashboard.update()
+
+    try:
+        refresh_all()
+        with cbreak() as terminal:
+            while True:
+                watched = [sys.stdin, wake_read] + ([notifier.fd] if notifier else [])
+                ready, _, _ = select.select(watched, [], [], None if notifier else POLL_INTERVAL)
+
+                if sys.stdin in ready:
+                    key = os.read(sys.stdin.fileno(), 1).lower()
+                    if key in (b'q', b'\x1b', b'\x04'):
+                        break
+                    if key == b'r':
+                        refresh_all()
+                    if key == b'c':
+                        terminal.__exit__()
+                        commit()
+                        terminal.__enter__()
+                        if notifier:
+                            notifier.read()
+                        refresh_all()
+                    continue
+
+                if wake_read in ready:
+                    os.read(wake_read, 64)
+                    dashboard.draw()
+
+                if notifier is None:
+                    # polling: the status call is the only way to see edits
+                    tracker.refresh()
+                    dashboard.update()
+                    continue
+
+                if notifier.fd in ready:
+                    events = notifier.read()
+                    waited = 0.0
+                    while waited < MAX_DEBOUNCE and select.select([notifier.fd], [], [], DEBOUNCE)[0]:
+                        events.extend(notifier.read())
+                        waited += DEBOUNCE
+                    names, paths, full = sorter.sort(events, notifier)
+                    if 'changes' in names:
+                        tracker.refresh(None if full else sorted(paths))
+                    if names:
+                        dashboard.update(names)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        signal.signal(signal.SIGWINCH, previous)
+        os.close(wake_read)
+        os.close(wake_write)
+        if notifier:
+            notifier.close()
+        sys.stdout.write('\n')
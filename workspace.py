@@ -0,0 +1,83 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from backend import CommandError, stream_command
+from changes import STATUS_KEYS, iter_status
+
+
+SKIP_DIRS = {'node_modules', '__pycache__', 'venv', '.venv'}
+
+
+#&                                                                                          DISCOVERY
+# Every repo under `root`, up to `max_depth` levels down. Repos aren't searched
+# for nested repos, and hidden and dependency directories are skipped.
+def find_repos(root, max_depth=3):
+    repos = []
+
+    def walk(path, depth):
+        try:
+            entries = sorted(os.scandir(path), key=lambda entry: entry.name)
+        except OSError:
+            return
+        if any(entry.name == '.git' for entry in entries):
+            repos.append(path)
+            return
+        if depth >= max_depth:
+            return
+        for entry in entries:
+            if entry.name.startswith('.') or entry.name in SKIP_DIRS:
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                walk(entry.path, depth + 1)
+
+    walk(os.path.abspath(root), 0)
+    return repos
+
+
+
+#&                                                                                          STATUS
+# Branch, upstream, ahead/behind and change counts of one repo, all from a
+# single `git status --porcelain=v2 --branch` (no index refresh, so repos that
+# someone is working in aren't locked). `error` says why a repo couldn't be read.
+def repo_summary(path):
+    summary = {
+        'path': path,
+        'branch': None,
+        'upstream': None,
+        'ahead': None,
+        'behind': None,
+        'change_counts': dict.fromkeys(STATUS_KEYS, 0),
+        'changed_total': 0,
+        'error': None,
+    }
+    records = []
+    try:
+        for token in stream_command(['git', '-C', path, '--no-optional-locks', 'status', '--porcelain=v2', '-z', '--branch', '--untracked-files=all']):
+            if token.startswith('# branch.head '):
+                summary['branch'] = token[len('# branch.head '):]
+            elif token.startswith('# branch.upstream '):
+                summary['upstream'] = token[len('# branch.upstream '):]
+            elif token.startswith('# branch.ab '):
+                ahead, behind = token[len('# branch.ab '):].split()
+                summary['ahead'], summary['behind'] = int(ahead), -int(behind)
+            else:
+                records.append(token)
+    except CommandError as e:
+        # one slow or broken repo is shown as unavailable, not the whole table
+        summary['error'] = str(e)
+        return summary
+
+    for status, _, _ in iter_status(records):
+        summary['changed_total'] += 1
+        key = 'R' if status[0] == 'R' else status[0]
+        if key in summary['change_counts']:
+            summary['change_counts'][key] += 1
+    return summary
+
+
+# Summaries of every repo, collected `jobs` at a time; each is a git process,
+# so threads are enough to keep them all busy. Results keep the order of `repos`.
+def collect_workspace(repos, jobs=None):
+    jobs = jobs or min(16, (os.cpu_count() or 1) * 2)
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(repo_summary, repos))